@@ -1,8 +1,9 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
 import pandas as pd
-from tifffile import imread, imwrite
+from tifffile import imwrite
 from scipy.ndimage import label, generate_binary_structure
 from datetime import datetime
 from pathlib import Path, PureWindowsPath
@@ -10,6 +11,9 @@ from functions.extract_unique_texts_between_underscores import extract_unique_te
 from functions.group_files_by_common_part import group_files_by_common_part 
 from functions.modify_filename import modify_filename
 from functions.check_continuity import check_continuity
+from functions.count_objects_per_frame import count_objects_per_frame
+from functions.image_stack import ImageStack
+from functions.artifact_cache import ArtifactCache
 from functions.wrapper_function import log_function_call
 
 import argparse
@@ -28,7 +32,10 @@ def Densiometer(PATH:str,
          neuropil_channel:str = "SYPH", 
          channels = ["SYPH", "PSD95"],
          x_y_ratio = None, 
-         z_ratio = None)-> None:
+         z_ratio = None,
+         workers:int = 1,
+         cache_dir:str = None,
+         cache_size:float = 2048)-> None:
     """
     Main function to perform density calculations on image files.
 
@@ -39,6 +46,10 @@ def Densiometer(PATH:str,
         threshold (float): The threshold value for object identification (default: 0.9).
         x_y_ratio (float): The pixel size ratio for X and Y dimensions (default: None).
         z_ratio (float): The pixel size ratio for the Z dimension (default: None).
+        workers (int): Number of channel images processed in parallel (default: 1).
+        cache_dir (str): Directory of the cache of intermediate results, the object counts and areas of each
+            image are saved there and reused by the next runs (default: None, no cache).
+        cache_size (float): Maximum size of the cache in MB (default: 2048).
 
     Returns:
         None
@@ -105,159 +116,63 @@ def Densiometer(PATH:str,
     dilating_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * 19 + 1, 2 * 19 + 1))
     eroding_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * 10 + 1, 2 * 10 + 1))
 
+    ## Cache of the measures of the channel images (shared between runs)
+    cache = ArtifactCache(cache_dir, int(cache_size * 2**20)) if cache_dir else None
+
     # MAIN LOOP
-    for Files in range(len(filelist)): # Iterate through Neuropil channel images
+    ## List the images of every channel capturing the same region as each neuropil channel image
+    Filegroups = [[filelist[Files]] + [filelist[Files].replace(channels[0], channels[iii]) for iii in range(1, len(channels))]
+                  for Files in range(len(filelist)) if (channels[0] in filelist[Files])] # Double check the image contains neuropil channel
+
+    ## Read, segment and measure every channel image, concurrently if selected (the channels are independent until the density step)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [[executor.submit(measure_channel, PATH, name, neuropil_channel, structure, frame_structure, dilating_kernel, eroding_kernel, save_masks, cache) 
+                        for name in Filegroup] for Filegroup in Filegroups]
+            Measures = [[future.result() for future in futures_group] for futures_group in futures]
+    else:
+        Measures = [[measure_channel(PATH, name, neuropil_channel, structure, frame_structure, dilating_kernel, eroding_kernel, save_masks, cache) 
+                     for name in Filegroup] for Filegroup in Filegroups]
+
+    for Filegroup_measures in Measures: # Iterate through Neuropil channel images
         
-        ## Create empty "Channels" dictionary to temporally store the results of the images capturing the same region.
-        Channels = {}
-
-        ## Double check the current image contains neuropil channel
-        if (channels[0] in filelist[Files]):
-            
-            ### Create an empty dictionary "Channel" inside the main dictionary for the current channel
-            Channels[0] = {}
-
-            ### Read image
-            Channels[0]["image"] = imread(os.path.join(PATH, filelist[Files]))
- 
-            ### Segment the image (keep values over 0)
-            Channels[0]["image"] = Channels[0]["image"] > 0
- 
-            ### Identify the continuous objects in a 3D continuum 
-            arr , ObjN = label(Channels[0]["image"], structure)
- 
-            ### Store the channel values obtained in the "Channel" dictionary
-            Channels[0]["CC"] = arr # Image with labeled objects
-            Channels[0]["objN"] = ObjN # Number of objects detected
-            Channels[0]["name"]=filelist[Files] # File name
-            
-            ### Object detection per frame
-            if len(Channels[0]["image"].shape) == 3: # Check if the image has more than 2 dimentions (is a stack)
-                print(f"First {Channels[0]['name']}")
-
-                #### Obtain the image dimension sizes
-                z,x,y = Channels[0]["image"].shape
-
-                #### Iterate through the frames
-                for image_frame in range(z):
-                    ##### Subset the frame from the image
-                    frame = Channels[0]["image"][image_frame,:,:]
-                    ##### Identify and quantify the objects of the frame with 2D connectivity
-                    arr , ObjN = label(frame, frame_structure)
-                    ##### Store the result to the "Channel" dictionary
-                    Channels[0]["frame_" + str(image_frame) + "_ObjN"] =  ObjN
-
-            ### Iterate throuh the other channels capturing the same ROI
-            for iii in  range (1, len(channels)):
-                
-                #### Create an empty dictionary "Channel" inside the main dictionary for the current channel
-                Channels[iii] = {}
+        ## Create the "Channels" dictionary to temporally store the results of the images capturing the same region.
+        Channels = dict(enumerate(Filegroup_measures))
 
-                #### read the image of the same region for the new selected channel
-                Channels[iii]["image"] = imread(os.path.join(PATH, filelist[Files].replace(channels[0], channels[iii])))
+        ### Obtain the neuropil area of the region from the neuropil channel
+        for iii in range(len(channels)):
+            if (neuropil_channel in Channels[iii]["name"]):
+                neuropilarea = Channels[iii]["areaneuropil"]
 
-                #### Segment the image (keep values over 0)
-                Channels[iii]["image"] = Channels[iii]["image"]>0
-                
-                #### Identify the continuous objects in a 3D continuum
-                arr, ObjN = label(Channels[iii]["image"], structure)
-                
-                #### Store the channel values obtained in the "Channel" dictionary
-                Channels[iii]["CC"] = arr # Image with labeled objects
-                Channels[iii]["objN"] = ObjN # Number of objects detected
-                Channels[iii]["name"]=filelist[Files].replace(channels[0], channels[iii]) # File name
-
-                #### Iterate through frames
-                if len(Channels[iii]["image"].shape) == 3: # Check if the image has more than 2 dimentions (is a stack)
-                    print(f"Second {Channels[iii]['name']}")
-
-                    ##### Obtain the image dimension sizes
-                    z,x,y = Channels[iii]["image"].shape
-                    
-                    ##### Iterate through the frames
-                    for image_frame in range(z):
-                        ##### Subset the frame from the image
-                        frame = Channels[iii]["image"][image_frame,:,:]
-                        ##### Identify and quantify the objects of the frame with 2D connectivity
-                        arr , ObjN = label(frame , frame_structure)
-                        ##### Store the result to the "Channel" dictionary
-                        Channels[iii]["frame_" + str(image_frame) + "_ObjN"] =  ObjN
-
-            ### Iterate through the channels given by the user
-            for iii in range(len(channels)):
-                
-                #### Obtain the channel Image shape
-                p,m,n = np.asarray(Channels[iii]["image"]).shape
-                
-                #### Calculate the total volume of pixels in the image
-                Channels[iii]["areatotal"] = m*n*p
-                
-                #### Calculate the pixel surface of each frame
-                Channels[iii]["layer_surface"] = m*n
-
-                #### Check if the channel is the neuritic channel defined by the user
-                if (neuropil_channel in Channels[iii]["name"]):
-
-                    ##### Generate a z-projection from the image stack keeping the maximum value of each pizel across the diferent frames
-                    zproj = np.max(Channels[iii]["image"], axis = 0)
-                    
-                    ##### Normalize the projection values 
-                    zproj = zproj * (255/np.max(zproj))
-                    
-                    ##### Dilation filter  
-                    zproj_dil = cv2.dilate(zproj, dilating_kernel)
-                    
-                    ##### Eroding filter
-                    neuropilmask = cv2.erode(zproj_dil, eroding_kernel)
-                    
-                    ##### Segmentation of the mask (keep values above 0)
-                    neuropilmask = neuropilmask >0
-                    
-                    ##### calculate the neuropil area substracting the calculated neuropil mask (per frame) from the total area.
-                    areaneuropil = Channels[iii]["areatotal"] - (np.sum(neuropilmask>0)*p)
-                    
-                    ##### Store the neuropil channel values obtained 
-                    Channels[iii]["areaneuropil"] = areaneuropil
-                    seq_name = Channels[iii]["name"]
-                    outputFileName = os.path.join(PATH,'Density_Results', 'Neuropilmask',str(seq_name)+'_neuropilMask.tif')
-                    
-                    ##### Save masks if needed 
-                    if save_masks:
-                        imwrite(outputFileName, neuropilmask)
-                    neuropilarea = Channels[iii]["areaneuropil"]
+        ### Iterate through channels
+        for iii in range(len(channels)):
                 
-                #### If it's not the neuropil channel
-                else:
-                    Channels[iii]["areaneuropil"] = 0
+            #### Neuropil area density
+            density_neuropil_area = ((Channels[iii]["objN"]/neuropilarea)/(Area_ratio))*10**9 
+            Channels[iii]["density_area_neuropil"] = density_neuropil_area
 
-            ### Iterate through channels
-            for iii in range(len(channels)):
-                
-                #### Neuropil area density
-                density_neuropil_area = ((Channels[iii]["objN"]/neuropilarea)/(Area_ratio))*10**9 
-                Channels[iii]["density_area_neuropil"] = density_neuropil_area
+            ####  Total area density
+            density_total_area = ((Channels[iii]["objN"]/Channels[iii]["areatotal"])/(Area_ratio))*10**9
+            Channels[iii]["density_total_area"] = density_total_area
 
-                ####  Total area density
-                density_total_area = ((Channels[iii]["objN"]/Channels[iii]["areatotal"])/(Area_ratio))*10**9
-                Channels[iii]["density_total_area"] = density_total_area
+            ####  Frame density calculations (all the frames at once)
+            if "frame_ObjN" in Channels[iii]:
+                density_frame = ((Channels[iii]["frame_ObjN"]/Channels[iii]["layer_surface"])/(Surface_ratio))*10**6
 
-                ####  Frame density calculations
-                A = sorted([key for key in Channels[iii].keys() if "frame_" in key])
-                for frame in A:
-                    Channels[iii]["density_" + frame.replace("_ObjN","")] = ((Channels[iii][frame]/Channels[iii]["layer_surface"])/(Surface_ratio))*10**6
+                #### Store the counts and densities as one column per frame, the densities sorted by column name
+                frame_objn = Channels[iii].pop("frame_ObjN")
+                Channels[iii].update({"frame_" + str(frame) + "_ObjN": frame_objn[frame] for frame in range(len(frame_objn))})
+                for frame in sorted(range(len(frame_objn)), key=lambda frame: "frame_" + str(frame) + "_ObjN"):
+                    Channels[iii]["density_frame_" + str(frame)] = density_frame[frame]
 
 
-            ### Append calculations to results dataframe
-            NewRow  = pd.DataFrame.from_dict(Channels, orient='index')
-            Results = pd.concat([Results, NewRow])
+        ### Append calculations to results dataframe
+        NewRow  = pd.DataFrame.from_dict(Channels, orient='index')
+        Results = pd.concat([Results, NewRow])
 
     # Set the index of each row correctly.
     Results.reset_index(drop=True, inplace=True)
     
-    # Remove the image storing columns 
-    columns_to_remove = ["image", "CC"]
-    Results.drop(columns=columns_to_remove, inplace=True)
-
     # create a list of the columns containing frame information.
     frame_columns = [col for col in Results.columns if col.startswith('frame')]
 
@@ -289,6 +204,110 @@ def Densiometer(PATH:str,
     Results.to_csv(os.path.join(PATH, outputfilename.replace(":", "_")) , sep='\t', index = False)
     print("Process complete.")
 
+def measure_channel(PATH:Path,
+                    name:str,
+                    neuropil_channel:str,
+                    structure:np.ndarray,
+                    frame_structure:np.ndarray,
+                    dilating_kernel:np.ndarray,
+                    eroding_kernel:np.ndarray,
+                    save_masks:bool = False,
+                    cache:ArtifactCache = None)->dict:
+    """
+    Read, segment and label a channel image and measure the values needed for its density.
+
+    Parameters:
+        PATH (Path): The path to the directory containing image files.
+        name (str): The filename of the channel image.
+        neuropil_channel (str): The neuropil channel identifier.
+        structure (numpy.ndarray): The 3D connectivity structure for object detection.
+        frame_structure (numpy.ndarray): The 2D connectivity structure for the object detection per frame.
+        dilating_kernel (numpy.ndarray): The kernel of the dilation filter of the neuropil mask.
+        eroding_kernel (numpy.ndarray): The kernel of the erosion filter of the neuropil mask.
+        save_masks (bool, optional): Whether to save the neuropil mask (default: False).
+        cache (ArtifactCache, optional): The cache where the values are read from or saved (default: None, no cache).
+            The values are calculated again when the masks are saved.
+
+    Returns:
+        dict: The values of the channel (objN, name, frame_ObjN if it's a stack, areatotal, layer_surface and areaneuropil).
+    """
+    ## Read the values from the cache if they were measured before with the same parameters
+    if cache is not None:
+        key = cache.key(os.path.join(PATH, name), "density_measures", structure=structure, frame_structure=frame_structure,
+                        dilating_kernel=dilating_kernel, eroding_kernel=eroding_kernel, neuropil=neuropil_channel in name)
+        entry = cache.get(key)
+        if entry is not None and not save_masks:
+            Channel = {"objN": entry["objN"][()], "name": name}
+            if "frame_ObjN" in entry:
+                Channel["frame_ObjN"] = entry["frame_ObjN"]
+            Channel.update({value: entry[value][()] for value in ("areatotal", "layer_surface", "areaneuropil")})
+            return Channel
+
+        Channel = measure_channel(PATH, name, neuropil_channel, structure, frame_structure, dilating_kernel, eroding_kernel, save_masks)
+        cache.put(key, {value: np.asarray(Channel[value]) for value in Channel if value != "name"})
+        return Channel
+
+    ## Create an empty dictionary "Channel" to store the values of the channel
+    Channel = {}
+
+    ## Read and segment the image frame by frame (keep values over 0)
+    image = ImageStack(os.path.join(PATH, name)).binarize(0)
+
+    ## Identify the continuous objects in a 3D continuum 
+    ObjN = label(image, structure)[1]
+
+    ## Store the channel values obtained in the "Channel" dictionary
+    Channel["objN"] = ObjN # Number of objects detected
+    Channel["name"] = name # File name
+
+    ## Object detection per frame
+    if len(image.shape) == 3: # Check if the image has more than 2 dimentions (is a stack)
+        print(name)
+
+        ### Identify and quantify the objects of every frame with 2D connectivity in a single labeling of the stack
+        Channel["frame_ObjN"] = count_objects_per_frame(image, frame_structure)
+
+    ## Obtain the channel Image shape
+    p,m,n = image.shape
+
+    ## Calculate the total volume of pixels in the image
+    Channel["areatotal"] = m*n*p
+
+    ## Calculate the pixel surface of each frame
+    Channel["layer_surface"] = m*n
+
+    ## Check if the channel is the neuritic channel defined by the user
+    if (neuropil_channel in name):
+
+        ### Generate a z-projection from the image stack keeping the maximum value of each pizel across the diferent frames
+        zproj = np.max(image, axis = 0)
+
+        ### Normalize the projection values 
+        zproj = zproj * (255/np.max(zproj))
+
+        ### Dilation filter  
+        zproj_dil = cv2.dilate(zproj, dilating_kernel)
+
+        ### Eroding filter
+        neuropilmask = cv2.erode(zproj_dil, eroding_kernel)
+
+        ### Segmentation of the mask (keep values above 0)
+        neuropilmask = neuropilmask >0
+
+        ### calculate the neuropil area substracting the calculated neuropil mask (per frame) from the total area.
+        Channel["areaneuropil"] = Channel["areatotal"] - (np.sum(neuropilmask>0)*p)
+
+        ### Save masks if needed 
+        if save_masks:
+            outputFileName = os.path.join(PATH,'Density_Results', 'Neuropilmask',str(name)+'_neuropilMask.tif')
+            imwrite(outputFileName, neuropilmask)
+
+    ## If it's not the neuropil channel
+    else:
+        Channel["areaneuropil"] = 0
+
+    return Channel
+
 ##########################################################################################
 # ARGUMENT PARSER
 
@@ -326,6 +345,21 @@ def main():
                         nargs='+',
                         default=["SYPH", "PSD95"],
                         help='List of channels to process (default: SYPH and PSD95).')
+    parser.add_argument("-w",
+                        '--workers',
+                        type=int,
+                        default=1,
+                        help='Number of channel images processed in parallel (default: 1).')
+    parser.add_argument('-cache',
+                        '--cache_dir',
+                        type=str,
+                        default=None,
+                        help='Directory of the cache of intermediate results shared between runs (default: no cache).')
+    parser.add_argument('-cmb',
+                        '--cache_size',
+                        type=float,
+                        default=2048,
+                        help='Maximum size of the cache in MB (default: 2048).')
 
     # Parse the command-line arguments
     args = parser.parse_args()
@@ -336,7 +370,10 @@ def main():
                 args.neuropil_channel,
                 args.channels,  # Pass the channels argument
                 args.x_y_ratio, 
-                args.z_ratio)
+                args.z_ratio,
+                args.workers,
+                args.cache_dir,
+                args.cache_size)
 
 # Execute the main function when the script is run
 if __name__ == '__main__':
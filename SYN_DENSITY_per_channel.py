@@ -3,9 +3,9 @@ import cv2
 import numpy as np
 import pandas as pd
 from datetime import datetime
-from tifffile import imread
 from scipy.ndimage import label, generate_binary_structure
 import argparse
+from functions.image_stack import ImageStack
 
 
 import warnings
@@ -79,10 +79,8 @@ def Densiometer(PATH,
         obj_ns = []
         densities = []
 
-        ## Read image
-        image = imread(os.path.join(PATH, filename)).astype(np.float32)
-        ## Normalize image values
-        image = image*(255/np.max(image))
+        ## Open the image, its frames are read and normalized (0-255) as float32 when they are used
+        image = ImageStack(os.path.join(PATH, filename), scale=255, float_dtype=np.float32)
         print(filename)
 
         ## Select the protein channel name
@@ -98,11 +96,12 @@ def Densiometer(PATH,
         areatotals.append(frame_n * x * y)
 
         # Thresholded object identification
-        th_image = np.zeros_like(image)
+        th_image = np.zeros(image.shape, dtype=np.uint8)
         object_per_stack = 0
         for i in range(frame_n):
             
-            th_image[i,:,:] = image[i,:,:] > np.max(image[i,:,:])*threshold
+            image_frame = image[i]
+            th_image[i,:,:] = image_frame > np.max(image_frame)*threshold
             layer_objs = label(th_image[i,:,:])[1]
             object_per_stack = object_per_stack + layer_objs
 
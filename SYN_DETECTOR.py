@@ -2,9 +2,9 @@ import argparse
 import os
 import cv2
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-from tifffile import imread, imwrite
 from datetime import datetime
 from PIL import Image 
 from tqdm import tqdm
@@ -14,9 +14,15 @@ from functions.group_files_by_common_part import group_files_by_common_part
 from functions.preprocess_image import preprocess_image 
 from functions.object_identificator import object_identificator 
 from functions.calculate_per_dist import calculate_per_dist 
-from functions.cmyk_to_rgb import cmyk_to_rgb 
+from functions.calculate_per_dist_edt import calculate_per_dist_edt
+from functions.pair_objects import pair_objects
+from functions.label_pixel_index import label_pixel_index
+from functions.export_rois import export_rois
 from functions.spiderwebs import spiderwebs 
 from functions.ROI_MAP import ROI_MAP
+from functions.async_image_writer import AsyncImageWriter
+from functions.image_stack import ImageStack
+from functions.artifact_cache import ArtifactCache
 from functions.wrapper_function import log_function_call
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
@@ -29,7 +35,13 @@ def extract_rois(PATH:str,
                  neuropil_channel = "SYPH",
                  saverois:bool = False,
                  Spiderweb:bool = False,
-                 RoiMap:bool = True):
+                 RoiMap:bool = True,
+                 workers:int = 1,
+                 frame_workers:int = 1,
+                 stack_only:bool = False,
+                 distance_method:str = "kdtree",
+                 cache_dir:str = None,
+                 cache_size:float = 2048):
     """
     Extract and analyze regions of interest (ROIs) from image files.
 
@@ -42,11 +54,23 @@ def extract_rois(PATH:str,
         saverois (bool, optional): Whether to save extracted ROIs (default: False).
         Spiderweb (bool, optional): Whether to generate spiderweb visualizations (default: False).
         RoiMap (bool, optional): Whether to generate ROI maps (default: True).
+        workers (int, optional): Number of file groups processed in parallel (default: 1).
+        frame_workers (int, optional): Number of frames of each file group processed in parallel (default: 1).
+        stack_only (bool, optional): Save only the filtered stacks, without a file per frame (default: False).
+        distance_method (str, optional): Perimeter distance engine, "kdtree" (calculate_per_dist) or "edt"
+            (calculate_per_dist_edt, distance transform). Both give the same results (default: "kdtree").
+        cache_dir (str, optional): Directory of the cache of intermediate results, the filtered stacks, labeled
+            objects and object proprieties of each image are saved there and reused by the next runs with the
+            same threshold and minimum area (default: None, no cache).
+        cache_size (float, optional): Maximum size of the cache in MB (default: 2048).
 
     Returns:
         None
     """
 
+    if distance_method not in ("kdtree", "edt"):
+        raise ValueError(f"Distance method {distance_method} not accepted. Select kdtree or edt.")
+
     # Windows path management
     Wpath = PureWindowsPath(PATH)
     PATH = Path(Wpath)
@@ -81,274 +105,310 @@ def extract_rois(PATH:str,
         os.mkdir(PATH / "ROI_MAPS")  
 
     ### File Management
-    for Filegroup in Files:
-        c=0
-        # Read files
-        image = imread(PATH / Filegroup[0])
-        image2 = imread(PATH / Filegroup[1])
-
-        #### Preprocess the image format  
-        image = image * (255 / np.max(image))
-        image2 = image2 * (255 / np.max(image2))
-
-        # Confirm the given image shapes match
-        if not image.shape == image2.shape:
-            print(f"Shapes of {Filegroup[0]} ({image.shape}) and {Filegroup[1]} ({image2.shape}) doesn't match")
-            continue
-        
-        # Extract image shapes
-        frame_n, x, y = image.shape
-        # Calculate the maximum distances 
-        max_distance_px = max_distance/x_y_ratio
-        max_distance_px = max_distance_px**2
-
-        # Generate empty images to store results and intermediate images
-        mask = np.zeros_like(image)
-        closed = np.zeros_like(image)
-        closed2 = np.zeros_like(image2)
-
-        # Generate empty dataframes to store the results
-        df = pd.DataFrame(columns = [
-                                    'ImageName',
-                                    'Frame',
-                                    'com',
-                                    'com2',
-                                    'object_label',
-                                    'object2_label',
-                                    'Distance_com',
-                                    'Distance_um',
-                                    'object_roi',
-                                    'object2_roi',
-                                    'big_roi',
-                                    'Area',
-                                    'Area2',
-                                    'Object_nearest_point',
-                                    'Object2_nearest_point',
-                                    'Min_distance'
-                                    ])
-        
-        image_props = pd.DataFrame()   
-        image2_props = pd.DataFrame()   
-        
-        # Iterate through frames
-        for frame in range(frame_n):
-            
-            # Apply a closing filter to the images
-            closing = preprocess_image(image, frame, th_percentage, kernel_3x3)
-            closing2 = preprocess_image(image2, frame, th_percentage, kernel_3x3)
-
-            # Store the filtered image to it's correspondent stack
-            closed[frame,:,:] = closing
-            closed2[frame,:,:] = closing2
+    if workers > 1:
+        # Process the file groups in parallel, each group on its own process
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_filegroup, PATH, Filegroup, x_y_ratio, max_distance, min_area, th_percentage, saverois, Spiderweb, RoiMap, kernel_3x3, frame_workers, stack_only, distance_method, cache_dir, cache_size) 
+                       for Filegroup in Files]
+            outcomes = []
+            for Filegroup, future in zip(Files, futures):
+                try:
+                    outcomes.append((Filegroup, future.result(), None))
+                except Exception as error:
+                    outcomes.append((Filegroup, None, error))
+    else:
+        outcomes = []
+        for Filegroup in Files:
+            try:
+                outcomes.append((Filegroup, process_filegroup(PATH, Filegroup, x_y_ratio, max_distance, min_area, th_percentage, saverois, Spiderweb, RoiMap, kernel_3x3, frame_workers, stack_only, distance_method, cache_dir, cache_size), None))
+            except Exception as error:
+                outcomes.append((Filegroup, None, error))
+
+    # Report the file groups that could not be processed
+    for Filegroup, df, error in outcomes:
+        if error is not None:
+            print(f"Processing of {Filegroup} failed: {type(error).__name__}: {error}")
+
+    # Merge the results of every file group in the order they were listed
+    results = [df for Filegroup, df, error in outcomes if df is not None]
+    if results:
+        # Generate the Results file name
+        results_detection_file = 'Results_Detection_' + str(current_time) + '.csv'
+
+        # Save the results dataframe as csv file.
+        pd.concat(results, ignore_index=True).to_csv(PATH / results_detection_file.replace(":","_"))
+
+
+def process_filegroup(PATH:Path,
+                      Filegroup:list,
+                      x_y_ratio:float,
+                      max_distance:float,
+                      min_area:int,
+                      th_percentage:float,
+                      saverois:bool,
+                      Spiderweb:bool,
+                      RoiMap:bool,
+                      kernel_3x3:np.ndarray,
+                      frame_workers:int = 1,
+                      stack_only:bool = False,
+                      distance_method:str = "kdtree",
+                      cache_dir:str = None,
+                      cache_size:float = 2048)->pd.DataFrame:
+    """
+    Detect the pairs of close objects of a group of files and save its filtered images and visualizations.
+
+    Parameters:
+        PATH (Path): The path to the directory containing image files.
+        Filegroup (list): The filenames of the 2 channels of the same region.
+        x_y_ratio (float): Pixel size ratio for image analysis.
+        max_distance (float): Maximum distance for considering objects as close.
+        min_area (int): Minimum area of objects to be considered.
+        th_percentage (float): Threshold percentage for image binarization.
+        saverois (bool): Whether to save extracted ROIs.
+        Spiderweb (bool): Whether to generate spiderweb visualizations.
+        RoiMap (bool): Whether to generate ROI maps.
+        kernel_3x3 (numpy.ndarray): The 3x3 kernel for morphological operations.
+        frame_workers (int, optional): Number of frames processed in parallel (default: 1).
+        stack_only (bool, optional): Save only the filtered stacks, without a file per frame (default: False).
+        distance_method (str, optional): Perimeter distance engine, "kdtree" or "edt" (default: "kdtree").
+        cache_dir (str, optional): Directory of the cache of intermediate results (default: None, no cache).
+        cache_size (float, optional): Maximum size of the cache in MB (default: 2048).
 
+    Returns:
+        pandas.DataFrame: The detection results of the file group, or None if the image shapes don't match.
+    """
+    # Perimeter distance engine
+    per_dist = calculate_per_dist_edt if distance_method == "edt" else calculate_per_dist
+
+    # Open the files, their frames are read and normalized (0-255) when they are used
+    image = ImageStack(PATH / Filegroup[0], scale=255)
+    image2 = ImageStack(PATH / Filegroup[1], scale=255)
+
+    # Confirm the given image shapes match
+    if not image.shape == image2.shape:
+        print(f"Shapes of {Filegroup[0]} ({image.shape}) and {Filegroup[1]} ({image2.shape}) doesn't match")
+        return None
+    
+    # Extract image shapes
+    frame_n, x, y = image.shape
+    # Calculate the maximum distances 
+    max_distance_px = max_distance/x_y_ratio
+    max_distance_px = max_distance_px**2
+
+    # Generate empty images to store results and intermediate images (8 bits, as they are saved)
+    mask = np.zeros(image.shape, dtype=np.uint8)
+    closed = np.zeros(image.shape, dtype=np.uint8)
+    closed2 = np.zeros(image2.shape, dtype=np.uint8)
+
+    # Filtered stacks, labeled objects and object proprieties of each channel saved on the cache by a previous run
+    cache = ArtifactCache(cache_dir, int(cache_size * 2**20)) if cache_dir else None
+    cache_keys = [cache.key(PATH / name, "detector_objects", th_percentage=th_percentage, kernel=kernel_3x3, min_area=min_area)
+                  for name in Filegroup[:2]] if cache else [None, None]
+    cached = [cache.get(key) if cache else None for key in cache_keys]
+    for channel, closed_stack in enumerate((closed, closed2)):
+        if cached[channel] is not None:
+            closed_stack[:] = cached[channel]["closed"]
+
+    # Labeled stacks of the channels that are not cached, to save them once every frame is processed
+    labeled_stacks = [np.zeros(image.shape, dtype=np.int32) if cache and cached[channel] is None else None for channel in range(2)]
+
+    def identify_objects(channel:int, frame:int)->tuple:
+        """
+        Filter a frame of a channel and identify its objects, or read them from the cache.
+        The filtered frame is stored in place on the closed or closed2 stack.
+        """
+        entry = cached[channel]
+        if entry is not None:
+            rows = slice(entry["frame_rows"][frame], entry["frame_rows"][frame + 1])
+            proprieties = pd.DataFrame({column: entry["props-" + column][rows] for column in entry["props_columns"]},
+                                       index=entry["props_index"][rows])
+            return entry["labeled"][frame], proprieties
+
+        # Apply a closing filter to the image and store it to it's correspondent stack
+        closing = preprocess_image((image, image2)[channel], frame, th_percentage, kernel_3x3)
+        (closed, closed2)[channel][frame,:,:] = closing
+
+        # Identify objects on the image and get their propieties
+        image_labeled, image_proprieties = object_identificator(closing, frame, min_area)
+        if labeled_stacks[channel] is not None:
+            labeled_stacks[channel][frame] = image_labeled
+        return image_labeled, image_proprieties
+
+    def process_frame(frame:int)->tuple:
+        """
+        Filter a frame of both images, pair their close objects and return the results of the frame.
+        The filtered frames and the ROIs are stored in place on the closed, closed2 and mask stacks.
+        """
+        # Filter the images and identify their objects (or read them from the cache)
+        image_labeled, image_proprieties = identify_objects(0, frame)
+        image2_labeled, image2_proprieties = identify_objects(1, frame)
+
+        # Save the filtered frame images unless only the stacks are selected
+        if not stack_only:
             # Generate filenames
             im_name = str(Filegroup[0]).replace(".tif", '_layer_closed_') + str(frame) + '.tif'
             im_name2 = str(Filegroup[1]).replace(".tif", '_layer_closed_') + str(frame) + '.tif'
 
-            # Save the filtered frame images
-            imwrite(PATH / "Filtered" / im_name, closing.astype(np.uint8))
-            imwrite(PATH / "Filtered" / im_name2, closing2.astype(np.uint8))
-
-            # Identify objects on the image and get their propieties
-            image_labeled, image_proprieties = object_identificator(closing, frame, min_area)
-            image2_labeled, image2_proprieties = object_identificator(closing2, frame, min_area)
-
-            # Concatenate the dataframe with the object proprieties per each image independently
-            image_props = pd.concat([image_props, image_proprieties])
-            image2_props = pd.concat([image2_props, image2_proprieties])
-
-            # Visual progressbar
-            with tqdm( total=image_proprieties.shape[0],desc= str(Filegroup[0])+"_"+str(frame) ,unit=' objects', leave=False) as progress_bar:
-
-                # Iterate throug objects found on the first image
-                for object_index, object_index_props in image_proprieties.iterrows():
-                    progress_bar.update(1)
-
-                    # Iterate through objects found on the second image
-                    for object2_index, object2_index_props in image2_proprieties.iterrows():
-                        
-                        # If the frame number does not match among the images go to the next object
-                        if object2_index_props["Frame"] != object_index_props["Frame"]:
-                            continue
-                        
-                        # Extract the x and y coordinates for each object centroid
-                        ob_x, ob_y = object_index_props['centroid-0'], object_index_props['centroid-1']
-                        ob2_x, ob2_y = object2_index_props['centroid-0'], object2_index_props['centroid-1']
-
-                        # Calculate the diference of position between the centroids of the 2 objects
-                        x_dif = np.abs(ob_x - ob2_x)
-                        y_dif = np.abs(ob_y - ob2_y)
-
-                        # Calculate the sum of the squared coordinate disatances ( Equivalent to hipotenusa  but without squared root for computational optimization)
-                        distance = x_dif**2 + y_dif**2
-
-                        # If the calculated distance is bigger than the max distance stablished by the user squared
-                        if distance < max_distance_px:
-                            c += 1
-                            
-                            # Calculate the distance using pythagoras (squared root of the sum of the squared cateters)
-                            distance_final = np.sqrt(x_dif**2 + y_dif**2)
-                            
-                            #Obtain a list of the coordinates of the pixels in each object
-                            object_positions = np.where(image_labeled == object_index)
-                            object2_positions = np.where(image2_labeled == object2_index)
-
-                            # Generate empty lists to append the positions
-                            POS_A = []
-                            POS_B = []
-
-                            # Format the positions in a list for easy access
-                            for posit in range(len(object_positions[0])):
-                                POS_A.append((object_positions[0][posit], object_positions[1][posit]))
-                            #
-                            for posit in range(len(object2_positions[0])):
-                                POS_B.append((object2_positions[0][posit], object2_positions[1][posit]))
-
-                            # Generate a set with the lists of pixel positions
-                            A_set = set(POS_A)
-                            B_set = set(POS_B)
-
-                            # Chech if there is an overlap of the objects
-                            if A_set.intersection(B_set):
-
-                                # Set the values for the overlap case
-                                min_distance = "OVERLAP"
-                                object_near_point = ""
-                                object2_near_point = ""
-
-                            # If there is no overlap between the objects
-                            else:
-                                # Calculate the minimum distance between the objects
-                                min_distance, object_near_point, object2_near_point, avg_min_dist = calculate_per_dist(POS_A, POS_B)
-
-                            # Obtain the rois that capture the objects 
-                            min_row, min_col, max_row, max_col = object_index_props['bbox-0'], object_index_props['bbox-1'], object_index_props['bbox-2'], object_index_props['bbox-3']
-                            min_row2, min_col2, max_row2, max_col2 = object2_index_props['bbox-0'], object2_index_props['bbox-1'], object2_index_props['bbox-2'], object2_index_props['bbox-3']
-
-                            # Select the minimum and maximum coordinates of the 2 objects with 10 pixels margin
-                            big_roi_min_x = min(min_row, min_row2) - 10
-                            big_roi_min_y = min(min_col, min_col2) - 10
-                            big_roi_max_x = max(max_row, max_row2) + 10
-                            big_roi_max_y = max(max_col, max_col2) + 10
-    
-                            # Ensure the roi exists in the image ( no negative pixels or position bigger than the image dimensions)
-                            big_roi_min_x = max(big_roi_min_x, 0)
-                            big_roi_max_x = min(big_roi_max_x, x-1)
-                            big_roi_min_y = max(big_roi_min_y, 0)
-                            big_roi_max_y = min(big_roi_max_y, y-1)
-
-                            #List the final positions of the roi that captures the 2 objects
-                            big_roi = [big_roi_min_x, 
-                                    big_roi_max_x,
-                                    big_roi_min_y, 
-                                    big_roi_max_y]
-
-                            # Create a dictionary to store the results obtained on the analisis process
-                            df_new_row = {
-                                'ImageName': Filegroup[0],
-                                'Frame': object2_index_props['Frame'],
-                                'com': [object_index_props['centroid-0'], object_index_props['centroid-1']],
-                                'com2': [object2_index_props['centroid-0'], object2_index_props['centroid-1']],
-                                'object_label': object_index,
-                                'object2_label': object2_index,
-                                'Distance_com': distance_final,
-                                'Distance_um' : distance_final*x_y_ratio,
-                                'object_roi': [min_row, min_col, max_row, max_col],
-                                'object2_roi': [min_row2, min_col2, max_row2, max_col2],
-                                'big_roi': big_roi,
-                                'Area': object_index_props['area'],
-                                'Area2': object2_index_props['area'],
-                                'Object_nearest_point': object_near_point,
-                                'Object2_nearest_point': object2_near_point,
-                                'Min_distance': min_distance
-                                }
-                            
-                            # Save the dictionary as a dataframe
-                            newrow = pd.DataFrame.from_dict(df_new_row)
-                            
-                            # Join the Results dataframe with the new generated dataframe.
-                            df = pd.concat([df, newrow], ignore_index= True)
-
-                            # Extract the ROI corner positions 
-                            i_x = int(big_roi[0])
-                            f_x = int(big_roi[1])
-                            i_y = int(big_roi[2])
-                            f_y = int(big_roi[3])
-                            
-                            # If the images are too big 
-                            if f_x - i_x >200 or f_y - i_y > 200:
-                                continue
-
-                            # Add the roi to the mask
-                            mask[int(df_new_row['Frame']), i_x:f_x, i_y:f_y] = 1
-
-                            # If the user selected to save images
-                            if saverois == True:
-                                
-                                # Generate a blank image of the size of the calculated roi in RGB format
-                                Final_ROI = np.zeros((frame_n,f_x-i_x,f_y-i_y, 3))
-
-                                # Generate a blank image of the size of the calculated roi in CMYK format
-                                ROI = np.zeros((frame_n,f_x-i_x,f_y-i_y, 4))
-
-                                #Iterate per frame
-                                for frame in range(frame_n):
-
-                                    # Calculate the positions of the center of mass for the 2 objects in the roi.
-                                    cm1x = int(ob_x) - int(i_x)
-                                    cm1y = int(ob_y) - int(i_y)
-                                    cm2x = int(ob2_x) - int(i_x)
-                                    cm2y = int(ob2_y) - int(i_y)
-
-                                    # Store each protein in a diferent color channel (Cyan and Magenta)
-                                    ROI[frame,:,:,0] = image[frame,i_x:f_x,i_y:f_y]
-                                    ROI[frame,:,:,1] = image2[frame,i_x:f_x,i_y:f_y]
-
-                                    # Set the center of mass pixels for each object yellow 
-                                    ROI[frame,cm1x,cm1y,:] = [0,0,255,0] 
-                                    ROI[frame,cm2x,cm2y,:] = [0,0,255,0]
-                                    
-                                    # transform the CMYK image format to RGB 
-                                    ROI_rgb = cmyk_to_rgb(ROI[frame,:,:,0] ,ROI[frame,:,:,1], ROI[frame,:,:,2], ROI[frame,:,:,3])
-                                    
-                                    # Store the frame in RGB on i'ts correpondent Image
-                                    Final_ROI[frame,:,:,:] = ROI_rgb.astype(np.uint8)
-                                
-                                # Save the generated RGB image of the ROI 
-                                ROIname = str(Filegroup[0]).replace('.tif','')+"_ROI_"+"_y_"+str(i_x)+"_"+str(f_x)+"_x_"+str(i_y)+"_"+str(f_y)+"_n_"+str(c)+".tif"
-                                imwrite(PATH / "ROIs"/ ROIname, Final_ROI.astype(np.uint8))
-
-############################### SAVE RESULTS ############################
+            writer.imwrite(PATH / "Filtered" / im_name, closed[frame])
+            writer.imwrite(PATH / "Filtered" / im_name2, closed2[frame])
+
+        # Index the pixel coordinates of every object once per frame
+        image_pixels = label_pixel_index(image_labeled)
+        image2_pixels = label_pixel_index(image2_labeled)
+
+        # Find the pairs of objects closer than the maximum distance using their centroids
+        positions, positions2, distances = pair_objects(image_proprieties, image2_proprieties, max_distance_px)
+
+        # Extract the proprieties of the objects of each pair
+        pair_props = image_proprieties.iloc[positions]
+        pair_props2 = image2_proprieties.iloc[positions2]
+        frames = pair_props2['Frame'].to_numpy()
+        labels = pair_props['label'].to_numpy()
+        labels2 = pair_props2['label'].to_numpy()
+        centroids = pair_props[['centroid-0', 'centroid-1']].to_numpy()
+        centroids2 = pair_props2[['centroid-0', 'centroid-1']].to_numpy()
+        bbox = pair_props[['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']].to_numpy()
+        bbox2 = pair_props2[['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']].to_numpy()
+
+        # Select the minimum and maximum coordinates of the 2 objects with 10 pixels margin
+        # ensuring the roi exists in the image ( no negative pixels or position bigger than the image dimensions)
+        big_roi = np.column_stack([np.maximum(np.minimum(bbox[:, 0], bbox2[:, 0]) - 10, 0),
+                                   np.minimum(np.maximum(bbox[:, 2], bbox2[:, 2]) + 10, x-1),
+                                   np.maximum(np.minimum(bbox[:, 1], bbox2[:, 1]) - 10, 0),
+                                   np.minimum(np.maximum(bbox[:, 3], bbox2[:, 3]) + 10, y-1)])
+
+        # Generate empty columns for the perimeter distances (the nearest points stay empty if the objects overlap)
+        min_distances = np.empty(len(positions), dtype=object)
+        near_points = np.full((len(positions), 2), np.nan)
+        near_points2 = np.full((len(positions), 2), np.nan)
+
+        # Visual progressbar
+        with tqdm( total=len(positions),desc= str(Filegroup[0])+"_"+str(frame) ,unit=' pairs', leave=False) as progress_bar:
+
+            # Iterate through the pairs of close objects
+            for pair in range(len(positions)):
+                progress_bar.update(1)
+
+                # Obtain the coordinates of the pixels in each object from the frame index
+                POS_A = image_pixels[labels[pair]]
+                POS_B = image2_pixels[labels2[pair]]
+
+                # Check if there is an overlap of the objects looking up the pixels of the first object on the second labeled image
+                if np.any(image2_labeled[POS_A[:, 0], POS_A[:, 1]] == labels2[pair]):
+
+                    # Set the values for the overlap case
+                    min_distances[pair] = "OVERLAP"
+
+                # If there is no overlap between the objects
+                else:
+                    # Calculate the minimum distance between the objects
+                    min_distances[pair], near_points[pair], near_points2[pair], avg_min_dist = per_dist(POS_A, POS_B)
+
+                # Extract the ROI corner positions 
+                i_x, f_x, i_y, f_y = big_roi[pair].astype(int)
+                
+                # If the images are too big 
+                if f_x - i_x >200 or f_y - i_y > 200:
+                    continue
+
+                # Add the roi to the mask
+                mask[int(frames[pair]), i_x:f_x, i_y:f_y] = 1
+
+        # Store the results of the frame on their columns, one column per coordinate
+        frame_results = {
+            'ImageName': np.full(len(positions), Filegroup[0], dtype=object),
+            'Frame': frames,
+            'com-0': centroids[:, 0],
+            'com-1': centroids[:, 1],
+            'com2-0': centroids2[:, 0],
+            'com2-1': centroids2[:, 1],
+            'object_label': labels,
+            'object2_label': labels2,
+            'Distance_com': distances,
+            'Distance_um': distances*x_y_ratio
+            }
+        frame_results.update({'object_roi-' + str(i): bbox[:, i] for i in range(4)})
+        frame_results.update({'object2_roi-' + str(i): bbox2[:, i] for i in range(4)})
+        frame_results.update({'big_roi-' + str(i): big_roi[:, i] for i in range(4)})
+        frame_results.update({
+            'Area': pair_props['area'].to_numpy(),
+            'Area2': pair_props2['area'].to_numpy(),
+            'Object_nearest_point-0': near_points[:, 0],
+            'Object_nearest_point-1': near_points[:, 1],
+            'Object2_nearest_point-0': near_points2[:, 0],
+            'Object2_nearest_point-1': near_points2[:, 1],
+            'Min_distance': min_distances
+            })
+
+        return frame_results, image_proprieties, image2_proprieties
+
+    # The images are written from a background thread while the frames are processed
+    with AsyncImageWriter() as writer:
+
+        # Iterate through frames, concurrently if selected (each frame only writes its own layer of the stacks)
+        if frame_workers > 1:
+            with ThreadPoolExecutor(max_workers=frame_workers) as executor:
+                frame_outputs = list(executor.map(process_frame, range(frame_n)))
+        else:
+            frame_outputs = [process_frame(frame) for frame in range(frame_n)]
 
         # Generate the filenames for the closed (filtered) image
         closed1_name = str(Filegroup[0]).replace(".tif", '_closed_') + '.tif'
         closed2_name = str(Filegroup[1]).replace(".tif", '_closed_') + '.tif'
-        
+
         # Generate the filename for the mask image
         mask_name = str(Filegroup[1]).replace(".tif", '_mask_') + '.tif'
-        
-        # Save the images with their respective names
-        imwrite(PATH / "Filtered" / closed1_name, closed.astype(np.uint8), imagej=True)
-        imwrite(PATH / "Filtered" / closed2_name, closed2.astype(np.uint8), imagej=True)
-        imwrite(PATH / "Filtered" / mask_name , mask.astype(np.uint8), imagej=True)
 
-        # Generate the Results file name
-        results_detection_file = 'Results_Detection_' + str(current_time) + '.csv'
-        
-        # Save the results dataframe as csv file.
-        df.to_csv(PATH / results_detection_file.replace(":","_"))
+        # Save the stacks with their respective names
+        writer.imwrite(PATH / "Filtered" / closed1_name, closed, imagej=True)
+        writer.imwrite(PATH / "Filtered" / closed2_name, closed2, imagej=True)
+        writer.imwrite(PATH / "Filtered" / mask_name , mask, imagej=True)
 
-#################### FINAL ROI MAP ############################################################
-        
-        # Generate spiderweb visualization if selected
-        if Spiderweb:
-            spiderwebs(image=image, image2= image2, df= df, mask= mask, filename= Filegroup[0], PATH= PATH, th_percentage=th_percentage)
+    # Generate the columns to store the results. Each frame appends its values and the dataframe is built once per image
+    results = {}
+    image_props = []
+    image2_props = []
+    for frame_results, image_proprieties, image2_proprieties in frame_outputs:
+        for column, values in frame_results.items():
+            results.setdefault(column, []).append(values)
+
+        # Store the object proprieties per each image independently
+        image_props.append(image_proprieties)
+        image2_props.append(image2_proprieties)
+
+############################### SAVE RESULTS ############################
 
-        # Generate Roi map visualization if selected
-        if RoiMap:
-            ROI_MAP(image=image, image2= image2, df= df, mask= mask, filename= Filegroup[0], PATH= PATH, th_percentage=th_percentage)
+    # Build the results and object proprieties dataframes once per image
+    df = pd.DataFrame({column: np.concatenate(values) for column, values in results.items()})
+    image_props = pd.concat(image_props)
+    image2_props = pd.concat(image2_props)
 
+    # Save the filtered stacks, labeled objects and object proprieties that were not cached
+    for channel, props in enumerate((image_props, image2_props)):
+        if labeled_stacks[channel] is not None:
+            frame_rows = np.concatenate(([0], np.cumsum([len(output[1 + channel]) for output in frame_outputs])))
+            entry = {"closed": (closed, closed2)[channel], "labeled": labeled_stacks[channel], "frame_rows": frame_rows,
+                     "props_columns": np.array(props.columns, dtype=str), "props_index": props.index.to_numpy()}
+            entry.update({"props-" + column: props[column].to_numpy() for column in props.columns})
+            cache.put(cache_keys[channel], entry)
+
+#################### FINAL ROI MAP ############################################################
     
+    # Generate spiderweb visualization if selected
+    if Spiderweb:
+        spiderwebs(image=image, image2= image2, df= df, mask= mask, filename= Filegroup[0], PATH= PATH, th_percentage=th_percentage)
+
+    # Generate Roi map visualization if selected
+    if RoiMap:
+        ROI_MAP(image=image, image2= image2, df= df, mask= mask, filename= Filegroup[0], PATH= PATH, th_percentage=th_percentage)
+
+    # Save the ROIs of the pairs of objects in a single file with its index if selected
+    if saverois == True:
+        export_rois(image=image, image2= image2, df= df, filename= Filegroup[0], PATH= PATH)
+
+    return df
+
+
 #########################################################################################
 # ARGPARSE
 
@@ -395,6 +455,36 @@ def main():
                         '--RoiMap', 
                         action='store_true', 
                         help='Generate ROI maps (default: True).')
+    parser.add_argument('-w',
+                        '--workers', 
+                        type=int, 
+                        default=1, 
+                        help='Number of file groups processed in parallel (default: 1).')
+    parser.add_argument('-fw',
+                        '--frame_workers', 
+                        type=int, 
+                        default=1, 
+                        help='Number of frames of each file group processed in parallel (default: 1).')
+    parser.add_argument('-so',
+                        '--stack_only', 
+                        action='store_true', 
+                        help='Save only the filtered stacks, without a file per frame (default: False).')
+    parser.add_argument('-dm',
+                        '--distance_method', 
+                        type=str, 
+                        default='kdtree', 
+                        choices=['kdtree', 'edt'], 
+                        help='Perimeter distance engine, KD-tree or distance transform (default: kdtree).')
+    parser.add_argument('-cache',
+                        '--cache_dir', 
+                        type=str, 
+                        default=None, 
+                        help='Directory of the cache of intermediate results shared between runs (default: no cache).')
+    parser.add_argument('-cmb',
+                        '--cache_size', 
+                        type=float, 
+                        default=2048, 
+                        help='Maximum size of the cache in MB (default: 2048).')
 
     args = parser.parse_args()
     
@@ -406,7 +496,13 @@ def main():
                  args.neuropil_ch,
                  args.saverois, 
                  args.Spiderweb, 
-                 args.RoiMap)
+                 args.RoiMap,
+                 args.workers,
+                 args.frame_workers,
+                 args.stack_only,
+                 args.distance_method,
+                 args.cache_dir,
+                 args.cache_size)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,20 +1,22 @@
 import os
 import numpy as np
-import tifffile
 import argparse
 import warnings
 import pandas as pd
 from tqdm import tqdm
-from skimage import measure
 from datetime import datetime
-from scipy.ndimage import label, center_of_mass
 from pathlib import Path, PureWindowsPath
 from math import sqrt
 from functions.extract_unique_texts_between_parentheses import extract_unique_texts_between_parentheses
 from functions.group_files_by_common_part2 import group_files_by_common_part 
 from functions.calculate_per_dist import calculate_per_dist
-from functions.combine_and_draw2 import combine_and_draw2
-from functions.combine_plots import combine_plots
+from functions.calculate_per_dist_edt import calculate_per_dist_edt
+from functions.append_csv import append_csv
+from functions.async_plotter import AsyncPlotter
+from functions.plot_distance_frame import plot_distance_frame
+from functions.image_stack import ImageStack
+from functions.label_largest_objects import label_largest_objects
+from functions.artifact_cache import ArtifactCache
 from functions.wrapper_function import log_function_call
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -23,19 +25,38 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 def workflow(PATH:str, 
              th_percent:float = 0.2, 
              x_y_ratio:float = 0.008, 
-             plot_save:bool = True)->None:
+             plot_save:bool = True,
+             distance_method:str = "kdtree",
+             plot_workers:int = 1,
+             plot_queue:int = 8,
+             chunk_size:int = 256,
+             cache_dir:str = None,
+             cache_size:float = 2048)->None:
     """
     Perform a workflow to analyze and measure objects in a series of microscopy images.
 
     This function reads a series of microscopy images from a specified directory, performs object
     detection and measurement, and saves the results to a CSV file. It also provides the option
-    to save visualization plots.
+    to save visualization plots. The results are appended to the CSV file in chunks while they are
+    calculated, so the memory used doesn't grow with the number of frames and the results of an
+    interrupted run are kept.
 
     Parameters:
         PATH (str): The path to the directory containing the microscopy images.
         th_percent (float): The threshold percentage for image binarization.
         x_y_ratio (float): The ratio of micrometers (um) to pixels (pix) for distance conversion.
         plot_save (bool): If True, generate and save visualization plots.
+        distance_method (str, optional): Perimeter distance engine, "kdtree" (calculate_per_dist) or "edt"
+            (calculate_per_dist_edt, distance transform). Both give the same results (default: "kdtree").
+        plot_workers (int, optional): Number of processes rendering the plots in parallel with the analysis,
+            0 to render them on the main process (default: 1).
+        plot_queue (int, optional): Maximum number of plots waiting to be rendered, it limits the memory
+            used by the pending plots (default: 8).
+        chunk_size (int, optional): Number of frames whose results are kept in memory before they are appended
+            to the CSV file, the results are also appended after each group of files (default: 256).
+        cache_dir (str, optional): Directory of the cache of intermediate results, the labeled stacks and largest objects
+            of each image are saved there and reused by the next runs with the same threshold (default: None, no cache).
+        cache_size (float, optional): Maximum size of the cache in MB (default: 2048).
 
     Returns:
         None
@@ -44,10 +65,16 @@ def workflow(PATH:str,
         >>> workflow("image_directory", 0.7, 0.1, True)
     """
 
+    if distance_method not in ("kdtree", "edt"):
+        raise ValueError(f"Distance method {distance_method} not accepted. Select kdtree or edt.")
+    per_dist = calculate_per_dist_edt if distance_method == "edt" else calculate_per_dist
+
     Wpath = PureWindowsPath(PATH)
     PATH = Path(Wpath)
 
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    results_file = "Distance_results_" + str(current_time) + ".csv"
+    results_path = PATH / results_file.replace(":", "_")
 
     file_list = [file for file in os.listdir(PATH) if file.endswith(".tif")]
     unique_texts_between_parentheses = extract_unique_texts_between_parentheses(file_list)
@@ -56,59 +83,38 @@ def workflow(PATH:str,
     if plot_save:
         if not os.path.exists(PATH / "VIZ"):
                             os.mkdir(PATH / "VIZ")
-    df = pd.DataFrame()
+    cache = ArtifactCache(cache_dir, int(cache_size * 2**20)) if cache_dir else None
+
+    frames_df = []
     count = 0
-    with tqdm( total=len(Files),desc= "Images processed" ,unit='image', leave=False) as progress_bar:
+    with AsyncPlotter(plot_workers if plot_save else 0, plot_queue) as plotter, \
+         tqdm( total=len(Files),desc= "Images processed" ,unit='image', leave=False) as progress_bar:
         for Filegroup in Files:
             progress_bar.update(1)
             count += 1
             Filegroup = sorted(Filegroup)
 
-            I = tifffile.imread(PATH / Filegroup[0])
-            I2 = tifffile.imread(PATH / Filegroup[1])
+            I = ImageStack(PATH / Filegroup[0])
+            I2 = ImageStack(PATH / Filegroup[1])
             CH1_name = str(extract_unique_texts_between_parentheses([Filegroup[0]])[0])
             CH2_name = str(extract_unique_texts_between_parentheses([Filegroup[1]])[0])
 
-            Dist = None
+            # Threshold and label every frame of each channel at once and find the largest object of each frame
+            labeled_A, offsets_A, largest_A, area_A, centroids_A, bbox_A = cached_largest_objects(cache, I, PATH / Filegroup[0], th_percent)
+            labeled_B, offsets_B, largest_B, area_B, centroids_B, bbox_B = cached_largest_objects(cache, I2, PATH / Filegroup[1], th_percent)
 
-            frame_range = 1 if len(I.shape) == 2 else I.shape[0] 
+            frame_range = len(labeled_A)
             for frame in range(frame_range):
                 
                 # miss object
-                miss_A = False
-                miss_B = False
-                if frame_range == 1:
-                    threshold_A = np.max(I)*th_percent
-                    threshold_B = np.max(I2)*th_percent
-
-                    # Threshold
-                    A = label(I>threshold_A)[0]
-                    B = label(I2>threshold_B)[0]
-
-                else:
-                    threshold_A = np.max(I[frame])*th_percent
-                    threshold_B = np.max(I2[frame])*th_percent
-
-                    A = label(I[frame]>threshold_A)[0]
-                    B = label(I2[frame]>threshold_B)[0]
-
-                PropA = measure.regionprops(A)
-                PropB = measure.regionprops(B)
-                
-                try:
-                    Index_A = max(PropA, key=lambda region: region.area).label
-                except:
-                    Index_A = 1
-                    miss_A = True
-                try:
-                    Index_B = max(PropB, key=lambda region: region.area).label
-                except:
-                    Index_B = 1
-                    miss_B = True
+                miss_A = largest_A[frame] == 0
+                miss_B = largest_B[frame] == 0
+                Index_A = largest_A[frame]
+                Index_B = largest_B[frame]
 
                 if miss_A == False and miss_B == False:
-                    COM_A = center_of_mass(A == Index_A)
-                    COM_B = center_of_mass(B == Index_B)
+                    COM_A = tuple(centroids_A[frame])
+                    COM_B = tuple(centroids_B[frame])
 
                     X = abs(COM_A[0] - COM_B[0]) if COM_A[0] > COM_B[0] else abs(COM_B[0] - COM_A[0])
                     Y = abs(COM_A[1] - COM_B[1]) if COM_A[1] > COM_B[1] else abs(COM_B[1] - COM_A[1])
@@ -116,21 +122,16 @@ def workflow(PATH:str,
                     COM_Dist = sqrt(X**2 + Y**2)
                     COM_Dist_um = COM_Dist * x_y_ratio
 
-                    POSA = np.where(A == Index_A)
-                    POSB = np.where(B == Index_B)
-
-                    POS_A = []
-                    POS_B = []
+                    # Pixels of each object, searched only on its bounding box
+                    box_A = tuple(slice(start, stop) for start, stop in zip(bbox_A[frame, :2], bbox_A[frame, 2:]))
+                    box_B = tuple(slice(start, stop) for start, stop in zip(bbox_B[frame, :2], bbox_B[frame, 2:]))
+                    POS_A = np.argwhere(labeled_A[frame][box_A] == Index_A) + bbox_A[frame, :2]
+                    POS_B = np.argwhere(labeled_B[frame][box_B] == Index_B) + bbox_B[frame, :2]
 
-                    for posit in range(len(POSA[0])):
-                        POS_A.append((POSA[0][posit], POSA[1][posit]))
-                    for posit in range(len(POSB[0])):
-                        POS_B.append((POSB[0][posit], POSB[1][posit]))
+                    # Pixels of both objects (only inside the bounding box of the object A)
+                    overlap = np.argwhere((labeled_A[frame][box_A] == Index_A) & (labeled_B[frame][box_A] == Index_B)) + bbox_A[frame, :2]
 
-                    A_set = set(POS_A)
-                    B_set = set(POS_B)
-
-                    if A_set.intersection(B_set):
+                    if len(overlap) > 0:
                         Per_Dist = "OVERLAP"
                         Per_Dist_um = "OVERLAP"
                         A_position = ""
@@ -139,7 +140,7 @@ def workflow(PATH:str,
                         Avg_per_dist = "CONTACT"
                         
                     else:
-                        Per_Dist, A_position, B_position, Avg_per_dist = calculate_per_dist(POS_A, POS_B, 3)
+                        Per_Dist, A_position, B_position, Avg_per_dist = per_dist(POS_A, POS_B, 3)
                         if Per_Dist == 0:
                             Per_Dist = "CONTACT"
                             per_Dist_um = "CONTACT"
@@ -152,28 +153,23 @@ def workflow(PATH:str,
 
 
                     if plot_save:
-                        center_of_mass_plot  = combine_and_draw2(A, B, COM_A, COM_B)
-                        if Per_Dist == "OVERLAP":
-                            X, Y = A.shape
-                            image1  = np.zeros((X, Y, 4), dtype=np.uint8)
-                            image1 [:, :, 0] = A*(255/np.max(A))
-                            image1 [:, :, 1] = B*(255/np.max(B))
-
-                            plot_perimeter_distance = image1
-
-                            for x,y in A_set.intersection(B_set):
-                                plot_perimeter_distance[x,y] = [0, 77, 255, 0] 
-                        else:    
-                            plot_perimeter_distance = combine_and_draw2(A, B, A_position, B_position)
+                        # Labels of the frame as if it was labeled on its own (smallest type, they are sent to the plotting process)
+                        A = np.where(labeled_A[frame] > 0, labeled_A[frame] - offsets_A[frame], 0)
+                        B = np.where(labeled_B[frame] > 0, labeled_B[frame] - offsets_B[frame], 0)
+                        label_type = np.min_scalar_type(max(A.max(), B.max()))
 
                         file_name = Filegroup[0].split("(")[0]+str(frame)+".png"
-                        combine_plots(A = A, 
-                                    B = B, 
-                                    image2 = center_of_mass_plot, 
-                                    image3 = plot_perimeter_distance, 
-                                    COM_dis = COM_Dist_um, 
-                                    PER_dis = Per_Dist_um,
-                                    Path = PATH / "VIZ" / file_name )
+                        plotter.plot(plot_distance_frame,
+                                     A.astype(label_type),
+                                     B.astype(label_type),
+                                     COM_A,
+                                     COM_B,
+                                     A_position,
+                                     B_position,
+                                     overlap,
+                                     COM_Dist_um,
+                                     Per_Dist_um,
+                                     PATH / "VIZ" / file_name)
 
 
                     data = {
@@ -183,10 +179,10 @@ def workflow(PATH:str,
                         'Centroid_'+CH2_name: COM_B,
                         'Perimeter_P_'+CH1_name: A_position,
                         'Perimeter_P_'+CH2_name: B_position,
-                        'Area_'+CH1_name: PropA[Index_A-1].area,
-                        'Area_'+CH2_name: PropB[Index_B-1].area,
-                        'Area_um_'+CH1_name: PropA[Index_A-1].area * x_y_ratio**2,
-                        'Area_um_'+CH2_name: PropB[Index_B-1].area * x_y_ratio**2,
+                        'Area_'+CH1_name: float(area_A[frame]),
+                        'Area_'+CH2_name: float(area_B[frame]),
+                        'Area_um_'+CH1_name: float(area_A[frame]) * x_y_ratio**2,
+                        'Area_um_'+CH2_name: float(area_B[frame]) * x_y_ratio**2,
                         'Center_Distance_px': COM_Dist,
                         'Perimeter_Distance_px' : Per_Dist,
                         'Center_Distance_um': COM_Dist_um,
@@ -196,19 +192,17 @@ def workflow(PATH:str,
                         }   
                 elif miss_A == True and miss_B == False:
 
-                    POSB = np.where(B == Index_B)
-
                     data = {
                         'Name': Filegroup[0].split("(")[0],
                         'Frame': frame,
                         'Centroid_'+CH1_name: "null",
-                        'Centroid_'+CH2_name: COM_B,
+                        'Centroid_'+CH2_name: tuple(centroids_B[frame]),
                         'Perimeter_P_'+CH1_name: "null",
                         'Perimeter_P_'+CH2_name: "null",
                         'Area_'+CH1_name: "null" ,
-                        'Area_'+CH2_name: PropB[Index_B-1].area,
+                        'Area_'+CH2_name: float(area_B[frame]),
                         'Area_um_'+CH1_name: "null",
-                        'Area_um_'+CH2_name: PropB[Index_B-1].area * x_y_ratio**2,
+                        'Area_um_'+CH2_name: float(area_B[frame]) * x_y_ratio**2,
                         'Center_Distance_px': "null",
                         'Perimeter_Distance_px' : "null",
                         'Center_Distance_um': "null",
@@ -218,19 +212,17 @@ def workflow(PATH:str,
                         }  
 
                 elif miss_A == False and miss_B == True:
-
-                    POSA = np.where(A == Index_A)
                     
                     data = {
                         'Name': Filegroup[0].split("(")[0],
                         'Frame': frame,
-                        'Centroid_'+CH1_name: COM_A,
+                        'Centroid_'+CH1_name: tuple(centroids_A[frame]),
                         'Centroid_'+CH2_name: "null",
                         'Perimeter_P_'+CH1_name: "null",
                         'Perimeter_P_'+CH2_name: "null",
-                        'Area_'+CH1_name: PropA[Index_A-1].area,
+                        'Area_'+CH1_name: float(area_A[frame]),
                         'Area_'+CH2_name: "null",
-                        'Area_um_'+CH1_name: PropA[Index_A-1].area * x_y_ratio**2,
+                        'Area_um_'+CH1_name: float(area_A[frame]) * x_y_ratio**2,
                         'Area_um_'+CH2_name: "null",
                         'Center_Distance_px': "null",
                         'Perimeter_Distance_px' : "null",
@@ -260,12 +252,53 @@ def workflow(PATH:str,
                         'Average_Distance_um': "null"
                         }
                 
-                df = pd.concat([df,pd.DataFrame.from_dict(data)])
-    results_file = "Distance_results_" + str(current_time) + ".csv"
-    df.to_csv(PATH / results_file.replace(":", "_"))
+                # A single row when no value is a centroid
+                frames_df.append(pd.DataFrame.from_dict(data) if (miss_A == False or miss_B == False) else pd.DataFrame(data, index=[0]))
+
+                # Save the results of the chunk
+                if len(frames_df) >= chunk_size:
+                    append_csv(pd.concat(frames_df), results_path)
+                    frames_df = []
+
+            # Save the results of the group of files
+            if frames_df:
+                append_csv(pd.concat(frames_df), results_path)
+                frames_df = []
+
+    # Empty results file if no frame was processed
+    if not os.path.exists(results_path):
+        pd.DataFrame().to_csv(results_path)
     print("Process complete.")
 
 
+def cached_largest_objects(cache:ArtifactCache,
+                           image:ImageStack,
+                           filename:Path,
+                           th_percent:float)->tuple:
+    """
+    Label the largest object of every frame of an image (label_largest_objects), reading the results from the cache if available.
+
+    Parameters:
+        cache (ArtifactCache): The cache of intermediate results, or None to always calculate them.
+        image (ImageStack): The image.
+        filename (Path): The path of the image file.
+        th_percent (float): Fraction of the maximum intensity of each frame used as threshold.
+
+    Returns:
+        tuple: The results of label_largest_objects (labeled, offsets, largest, area, centroids, bbox).
+    """
+    names = ("labeled", "offsets", "largest", "area", "centroids", "bbox")
+    if cache is None:
+        return label_largest_objects(image, th_percent)
+
+    key = cache.key(filename, "largest_objects", th_percent=th_percent)
+    entry = cache.get(key)
+    if entry is None:
+        results = label_largest_objects(image, th_percent)
+        cache.put(key, dict(zip(names, results)))
+        return results
+    return tuple(entry[name] for name in names)
+
 #####################################################################################
 # Parser 
 
@@ -288,11 +321,48 @@ def main():
                         "--plot_save", 
                         action="store_true", 
                         help="Save visualization plots")
+    parser.add_argument("-dm",
+                        "--distance_method", 
+                        type=str, 
+                        default="kdtree", 
+                        choices=["kdtree", "edt"], 
+                        help="Perimeter distance engine, KD-tree or distance transform (default: kdtree)")
+    parser.add_argument("-pw",
+                        "--plot_workers", 
+                        type=int, 
+                        default=1, 
+                        help="Number of processes rendering the plots, 0 to render them on the main process (default: 1)")
+    parser.add_argument("-pq",
+                        "--plot_queue", 
+                        type=int, 
+                        default=8, 
+                        help="Maximum number of plots waiting to be rendered (default: 8)")
+    parser.add_argument("-cs",
+                        "--chunk_size", 
+                        type=int, 
+                        default=256, 
+                        help="Number of frames whose results are kept in memory before saving them (default: 256)")
+    parser.add_argument("-cache",
+                        "--cache_dir", 
+                        type=str, 
+                        default=None, 
+                        help="Directory of the cache of intermediate results shared between runs (default: no cache)")
+    parser.add_argument("-cmb",
+                        "--cache_size", 
+                        type=float, 
+                        default=2048, 
+                        help="Maximum size of the cache in MB (default: 2048)")
     args = parser.parse_args()
     workflow(args.PATH, 
              args.th_percent, 
              args.x_y_ratio,
-             args.plot_save)
+             args.plot_save,
+             args.distance_method,
+             args.plot_workers,
+             args.plot_queue,
+             args.chunk_size,
+             args.cache_dir,
+             args.cache_size)
 
 
 if __name__ == "__main__":
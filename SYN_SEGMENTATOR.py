@@ -1,9 +1,19 @@
 import os
 import numpy as np
-from tifffile import imread, imwrite, imsave
-from scipy.ndimage import label, median_filter
-from skimage.measure import regionprops
-import cv2
+import pandas as pd
+from datetime import datetime
+from itertools import product, tee
+from concurrent.futures import ProcessPoolExecutor
+from scipy.ndimage import label
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from functions.component_statistics import component_statistics
+from functions.image_stack import ImageStack
+from functions.imwrite_atomic import imwrite_atomic
+from functions.filter_objects_by_size import filter_objects_by_size
+from functions.local_background_frames import local_background_frames
+from functions.local_threshold_frames import local_threshold_frames
+from functions.pixel_graph import pixel_graph
 import argparse 
 
 def segment(srcPath:str = "/media/jaumatell/datos/MicroscopyIMG/DENSITY_02_24/231127/PSD95",
@@ -14,142 +24,313 @@ def segment(srcPath:str = "/media/jaumatell/datos/MicroscopyIMG/DENSITY_02_24/23
             min_size:int = 150, # MINIM PIXELS AREA EN L'STACK
             max_size:int = 9999, # MAXIM PIXELS AREA EN L'STACK 
             th_2d:float = 0, # NO TOCAR AQUEST
-            th_3d:float = 0.2):
+            th_3d:float = 0.2,
+            workers:int = 1):
     
     output_path = os.path.join(srcPath, "Segmented_for_density")
-    os.mkdir(output_path) 
+    os.makedirs(output_path, exist_ok=True)
     srcFiles = [f for f in os.listdir(srcPath) if f.endswith('.tif')]
-    seq = []
-
-    for iterator_value in range(len(srcFiles)):
-        jj = iterator_value
-        file_name = srcFiles[iterator_value]
-
-        print(f"Starting image {file_name}.")
-
-        I = imread(os.path.join(srcPath, file_name))
-        seq.append({"name": file_name, "I": np.uint16(I)})
-        f, c, p = I.shape
-
-        is_binary_image = np.all((I == 0) | (I == 1))
-        if is_binary_image:
-            print(f'The image {seq[jj]["name"]} is a bw image. It will not be processed')
-        else:
-            Imat = I.astype(float) / np.max(I)
-            meanImat = np.zeros_like(Imat)
-            sImat = meanImat
-            medianImat = np.zeros_like(Imat)
-            bwImat = meanImat
-            join1D = np.zeros((c, p))
-            join2D = np.zeros_like(bwImat).astype(np.uint8)
-
-            for i in range(f):
-
-                meanImat[i, :, :] = cv2.blur(Imat[1, :, :], (int(ws), int(ws)))
-                img_to_store = meanImat * 255/np.max(meanImat)
-
-                C = -np.mean(Imat[i, :, :]) / r
-                sImat[i, :, :] = meanImat[i, :, :] - Imat[i, :, :] - C
-                sImat = sImat * (255/np.max(sImat))
-                
-                bwImat[i, :, :] = sImat[i, :, :] > th_2d
-                bwImat[i, :, :] = np.logical_not(bwImat[i, :, :])
-                bwImat = bwImat * (255/np.max(bwImat))
-            
-            labeled_bw, num_objects = label(bwImat[i, :, :], structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
-
-            for i in range(f):
-                labeled_bw, num_objects = label(bwImat[i, :, :], structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
-                for obj_id in range(1, num_objects + 1):
-                    pix_id = np.where(labeled_bw == obj_id)
-                    if len(pix_id[0]) > min_size_2d:
-                        for pix in range(len(pix_id[0])):
-                            join1D[pix_id[0][pix], pix_id[1][pix]] = 1
-
-                join2D[i, :, :] = join1D
-                join1D = np.zeros((c, p))
-
-            imwrite(os.path.join(output_path, file_name + "_join2D.tif"), join2D.astype(np.uint8))
-
-            labeled_j2D, num_objects_j2D = label(join2D, structure=np.ones((3, 3, 3)))
-            props_j2D = regionprops(labeled_j2D)
-
-            join3D = np.zeros_like(join2D)
-            for obj in props_j2D:
-                object_size = obj["area"]
-                Num_frames = len(np.unique(obj["coords"][:,0]))
-                if (Num_frames > 1 and object_size + 1 > min_size and object_size + 1 < max_size):
-                    join3D[obj.coords[:, 0], obj.coords[:, 1], obj.coords[:, 2]] = True
-
-            segmented_image = join3D * (I * (255/65535))
-            join3D = join3D * (255/np.max(join3D))
-            output_file_name = os.path.join(output_path, file_name + '_join3D' + '_segmented.tif')
-            imwrite(output_file_name, join3D.astype(np.uint8), append=True, photometric= "minisblack")
-            output_file_name = os.path.join(output_path, file_name + '_join3D' + '_mask.tif')
-            imwrite(output_file_name, segmented_image.astype(np.uint8), append=True, photometric= "minisblack")
-
-            print("Object selection")
-            thIseg3D = np.zeros_like(segmented_image)
-            for i in range(f):
-                thIseg3D[i, :, :] = segmented_image[i, :, :] > (th_3d*np.max(segmented_image))
-                labeled_bw2, num_objects2 = label(thIseg3D[i, :, :], structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
-            join1D2 = np.zeros((c, p))
-            join2D2 = np.zeros_like(thIseg3D)
-
-
-            for i in range(f):
-                labeled_bw2, num_objects2 = label(thIseg3D[i, :, :], structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
-                count_obj = 0
-                for obj_id in range(1, num_objects2 + 1):
-                    pix_id = np.where(labeled_bw2 == obj_id)
-                    if len(pix_id[0]) > min_size_2d:
-                        count_obj = count_obj + 1
-                        for pix in range(len(pix_id[0])):
-                            join1D2[pix_id[0][pix], pix_id[1][pix]] = 1                
-                join2D2[i, :, :] = join1D2
-                join1D2 = np.zeros((c, p))
-            imwrite(os.path.join(output_path, file_name + "_join2D2.tif"), join2D2.astype(np.uint8)*255, photometric= "minisblack") 
-
-            labeled_j2D2, num_objects_j2D2 = label(join2D2, structure=np.ones((3, 3, 3)))
-            props_j2D2 = regionprops(labeled_j2D2)
-
-            join3D2 = np.zeros_like(join2D2)
-            for obj in props_j2D2:
-                object_size = obj["area"]
-                # Check if there is more than one different frame on the pixels pb the object 
-                Num_frames = len(np.unique(obj["coords"][:,0]))
-                if (Num_frames > 1 and object_size + 1 > min_size and object_size + 1 < max_size):
-                    join3D2[obj.coords[:, 0], obj.coords[:, 1], obj.coords[:, 2]] = True
-
-            segmented_image2 = np.zeros_like(join3D2)
-            segmented_image2 = (join3D2/255) * I
-            segmented_image2 = segmented_image2 * (255/np.max(I))
-            segmented_image2 = segmented_image2.astype(np.uint8)
-            segmented_image2 = segmented_image2 *255
-
-            join3D2 = join3D2 * (255/np.max(join3D2))
 
+    # Variable names and values of the run
+    parameters = (f"srcPath: {srcPath}\n"
+                  f"WS: {ws}\n"
+                  f"r: {r}\n"
+                  f"method: {method}\n"
+                  f"min_size_2d: {min_size_2d}\n"
+                  f"min_size: {min_size}\n"
+                  f"max_size: {max_size}\n"
+                  f"threshold_2d: {th_2d}\n"
+                  f"threshold_3d: {th_3d}\n")
+
+    # The outputs of a previous run are only reused if it was run with the same parameters
+    parameters_file = os.path.join(output_path, "parameters.txt")
+    previous_parameters = None
+    if os.path.exists(parameters_file):
+        with open(parameters_file) as file:
+            previous_parameters = file.read()
+    if previous_parameters != parameters:
+        # The last output of each image marks it as complete, remove the ones obtained with other parameters
+        for file_name in srcFiles:
             output_file_name = os.path.join(output_path, file_name + '_join3D2' + '_segmented.tif')
-            imwrite(output_file_name, join3D2.astype(np.uint8), photometric= "minisblack")
+            if os.path.exists(output_file_name):
+                os.remove(output_file_name)
+        with open(parameters_file + ".tmp", 'w') as file:
+            file.write(parameters)
+        os.replace(parameters_file + ".tmp", parameters_file)
+
+    pending_files = [f for f in srcFiles if not os.path.exists(os.path.join(output_path, f + '_join3D2' + '_segmented.tif'))]
+    if len(pending_files) < len(srcFiles):
+        print(f"Skipping {len(srcFiles) - len(pending_files)} images already segmented with the same parameters.")
+
+    if workers > 1:
+        # Segment the images in parallel, each image on its own process
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(segment_file, srcPath, file_name, output_path, ws, r, method, min_size_2d, min_size, max_size, th_2d, th_3d) 
+                       for file_name in pending_files]
+            errors = []
+            for file_name, future in zip(pending_files, futures):
+                try:
+                    future.result()
+                except Exception as error:
+                    errors.append((file_name, error))
+    else:
+        errors = []
+        for file_name in pending_files:
+            try:
+                segment_file(srcPath, file_name, output_path, ws, r, method, min_size_2d, min_size, max_size, th_2d, th_3d)
+            except Exception as error:
+                errors.append((file_name, error))
+
+    # Report the images that could not be segmented, they are segmented again on the next run
+    for file_name, error in errors:
+        print(f"Segmentation of {file_name} failed: {type(error).__name__}: {error}")
 
-            output_file_name = os.path.join(output_path, file_name + '_join3D2' + '_mask.tif')
-            imwrite(output_file_name, segmented_image2.astype(np.uint8), photometric= "minisblack")
+    print("Process complete.")
+
+def segment_file(srcPath:str,
+                 file_name:str,
+                 output_path:str,
+                 ws:int,
+                 r:float,
+                 method:str,
+                 min_size_2d:int,
+                 min_size:int,
+                 max_size:int,
+                 th_2d:float,
+                 th_3d:float)->None:
+    """
+    Segment a single image of the source directory and write its outputs on the output directory.
+
+    Every output is written atomically and the '_join3D2_segmented.tif' image is written the last,
+    so its existence means the image was completely segmented.
+
+    Parameters:
+        srcPath (str): Directory containing the image.
+        file_name (str): Name of the image.
+        output_path (str): Directory where the outputs are written.
+        ws, r, method, min_size_2d, min_size, max_size, th_2d, th_3d: Parameters of the segmentation (see segment).
+
+    Returns:
+        None
+    """
+    print(f"Starting image {file_name}.")
+
+    # Open the image, its frames are read and normalized (0-1) when they are used
+    I = ImageStack(os.path.join(srcPath, file_name), scale=1)
+    f, c, p = I.shape
+
+    # Check frame by frame if the image only contains 0 and 1
+    is_binary_image = all(np.all((frame == 0) | (frame == 1)) for frame in map(I.raw, range(f)))
+    if is_binary_image:
+        print(f'The image {file_name} is a bw image. It will not be processed')
+    else:
+        # Segment the frames one at a time and keep the objects of each frame bigger than the minimum surface
+        join2D = np.zeros(I.shape, dtype=np.uint8)
+        for i, frame_bw in enumerate(local_threshold_frames(I, ws, r, th_2d, method)):
+            labeled_bw, num_objects = label(frame_bw, structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
+            join2D[i, :, :] = filter_objects_by_size(labeled_bw, min_size_2d)
+
+        imwrite_atomic(os.path.join(output_path, file_name + "_join2D.tif"), join2D)
+
+        # Keep the 3D objects present in more than one frame with a size (+1) between the minimum and maximum size
+        labeled_j2D, num_objects_j2D = label(join2D, structure=np.ones((3, 3, 3)))
+        join3D = filter_objects_by_size(labeled_j2D, min_size - 1, max_size - 1, min_frames=2)
+        del labeled_j2D
+
+        # Intensity (8 bits) of the selected objects, calculated frame by frame when it's needed
+        def segmented_frame(i:int)->np.ndarray:
+            return join3D[i] * (I.raw(i) * (255/65535))
+
+        output_file_name = os.path.join(output_path, file_name + '_join3D' + '_segmented.tif')
+        imwrite_atomic(output_file_name, join3D.astype(np.uint8)*255, photometric= "minisblack")
+        output_file_name = os.path.join(output_path, file_name + '_join3D' + '_mask.tif')
+        imwrite_atomic(output_file_name, (segmented_frame(i).astype(np.uint8) for i in range(f)), shape=I.shape, dtype=np.uint8, photometric= "minisblack")
+
+        print("Object selection")
+        # Threshold the selected objects with the maximum intensity of the stack and keep the objects of each frame bigger than the minimum surface
+        threshold_3d = th_3d*max(np.max(segmented_frame(i)) for i in range(f))
+        join2D2 = np.zeros(I.shape, dtype=bool)
+        for i in range(f):
+            labeled_bw2, num_objects2 = label(segmented_frame(i) > threshold_3d, structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
+            join2D2[i, :, :] = filter_objects_by_size(labeled_bw2, min_size_2d)
+        imwrite_atomic(os.path.join(output_path, file_name + "_join2D2.tif"), join2D2.astype(np.uint8)*255, photometric= "minisblack") 
+
+        # Keep the 3D objects present in more than one frame with a size (+1) between the minimum and maximum size
+        labeled_j2D2, num_objects_j2D2 = label(join2D2, structure=np.ones((3, 3, 3)))
+        join3D2 = filter_objects_by_size(labeled_j2D2, min_size - 1, max_size - 1, min_frames=2)
+        del labeled_j2D2
+
+        # Intensity of the final objects normalized to the maximum of the image, calculated frame by frame
+        def segmented_frame2(i:int)->np.ndarray:
+            segmented_image2 = (join3D2[i]/255) * I.raw(i)
+            segmented_image2 = segmented_image2 * (255/I.max())
+            return segmented_image2.astype(np.uint8)*255
+
+        output_file_name = os.path.join(output_path, file_name + '_join3D2' + '_mask.tif')
+        imwrite_atomic(output_file_name, (segmented_frame2(i) for i in range(f)), shape=I.shape, dtype=np.uint8, photometric= "minisblack")
+
+        # Written the last, it marks the image as completely segmented
+        output_file_name = os.path.join(output_path, file_name + '_join3D2' + '_segmented.tif')
+        imwrite_atomic(output_file_name, join3D2.astype(np.uint8)*255, photometric= "minisblack")
+
+def sweep(srcPath:str,
+          ws:list = [150],
+          r:list = [1.5],
+          method:list = ["mean"],
+          min_size_2d:list = [64],
+          min_size:list = [150],
+          max_size:list = [9999],
+          th_2d:list = [0],
+          th_3d:list = [0.2],
+          workers:int = 1)->None:
+    """
+    Segment the images of a directory with every combination of a grid of parameters and save the number of objects obtained.
+
+    Each stage of the segmentation is calculated once for every distinct setting of the parameters
+    it depends on: the local background once per window size and method, the 2D segmentation once
+    per r, th_2d and min_size_2d and the 3D labeling once per 2D segmentation. The size filters only
+    select labels, and the second thresholding (th_3d) is repeated for each combination on the graph of
+    the segmented pixels only (see pixel_graph). No images are saved.
+
+    Parameters:
+        srcPath (str): Directory containing the tif images.
+        ws, r, method, min_size_2d, min_size, max_size, th_2d, th_3d (list): Values of each parameter (see segment).
+        workers (int, optional): Number of images processed in parallel (default: 1).
+
+    Returns:
+        None. The results are saved as 'Sweep_results_<date>.csv' on the 'Segmented_for_density' directory,
+        with a row per image and combination of parameters.
+
+    Example:
+        >>> sweep("images", ws=[100, 150], r=[1.25, 1.5], th_3d=[0.1, 0.2, 0.3])
+    """
+    output_path = os.path.join(srcPath, "Segmented_for_density")
+    os.makedirs(output_path, exist_ok=True)
+    srcFiles = [f for f in os.listdir(srcPath) if f.endswith('.tif')]
 
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    grid = (ws, r, method, min_size_2d, min_size, max_size, th_2d, th_3d)
 
-    with open(os.path.join(output_path, "parameters.txt"), 'w') as file:
-        # Write variable names and values to the file
-        file.write(f"srcPath: {srcPath}\n")
-        file.write(f"WS: {ws}\n")
-        file.write(f"r: {r}\n")
-        file.write(f"method: {method}\n")
-        file.write(f"min_size_2d: {min_size_2d}\n")
-        file.write(f"min_size: {min_size}\n")
-        file.write(f"max_size: {max_size}\n")
-        file.write(f"threshold_2d: {th_2d}\n")
-        file.write(f"threshold_3d: {th_3d}\n")
+    if workers > 1:
+        # Process the images in parallel, each image on its own process
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(sweep_file, srcPath, file_name, *grid) for file_name in srcFiles]
+            rows = [row for future in futures for row in future.result()]
+    else:
+        rows = [row for file_name in srcFiles for row in sweep_file(srcPath, file_name, *grid)]
+
+    results_file = "Sweep_results_" + str(current_time) + ".csv"
+    pd.DataFrame(rows).to_csv(os.path.join(output_path, results_file.replace(":", "_")))
 
     print("Process complete.")
 
+def sweep_file(srcPath:str,
+               file_name:str,
+               ws_values:list,
+               r_values:list,
+               methods:list,
+               min_size_2d_values:list,
+               min_size_values:list,
+               max_size_values:list,
+               th_2d_values:list,
+               th_3d_values:list)->list:
+    """
+    Segment a single image with every combination of the parameters and count the objects obtained (see sweep).
+
+    Parameters:
+        srcPath (str): Directory containing the image.
+        file_name (str): Name of the image.
+        ws_values, r_values, methods, min_size_2d_values, min_size_values, max_size_values, th_2d_values, th_3d_values (list):
+            Values of each parameter of the segmentation.
+
+    Returns:
+        list: A dictionary per combination with its parameters and the number of objects of the join2D,
+        join3D and join3D2 images (3D connectivity). Empty if the image is a bw image.
+    """
+    print(f"Starting image {file_name}.")
+
+    I = ImageStack(os.path.join(srcPath, file_name), scale=1)
+    f, c, p = I.shape
+
+    is_binary_image = all(np.all((frame == 0) | (frame == 1)) for frame in map(I.raw, range(f)))
+    if is_binary_image:
+        print(f'The image {file_name} is a bw image. It will not be processed')
+        return []
+
+    rows = []
+    for method, ws in product(methods, ws_values):
+        # The local background of each frame is calculated once and shared by the segmentations of every r and th_2d,
+        # which advance together frame by frame so only the current frame is kept
+        settings_2d = list(product(r_values, th_2d_values))
+        backgrounds = tee(local_background_frames(I, ws, method), len(settings_2d))
+        thresholds = [local_threshold_frames(I, ws, r, th_2d, method, backgrounds=frame_backgrounds) 
+                      for (r, th_2d), frame_backgrounds in zip(settings_2d, backgrounds)]
+
+        join2D = {(r, th_2d, ms2d): np.zeros(I.shape, dtype=np.uint8) for (r, th_2d), ms2d in product(settings_2d, min_size_2d_values)}
+        for i, frames_bw in enumerate(zip(*thresholds)):
+            for (r, th_2d), frame_bw in zip(settings_2d, frames_bw):
+                labeled_bw, num_objects = label(frame_bw, structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
+                for ms2d in min_size_2d_values:
+                    join2D[r, th_2d, ms2d][i, :, :] = filter_objects_by_size(labeled_bw, ms2d)
+
+        for (r, th_2d, ms2d), join in join2D.items():
+            labeled_j2D, num_objects_j2D = label(join, structure=np.ones((3, 3, 3)))
+
+            # Size and number of frames of every 3D object, shared by every size filter
+            sizes, frames, bbox = component_statistics(labeled_j2D, num_objects_j2D)
+
+            # The objects of the second thresholding are always inside the objects of join2D, so they are obtained
+            # from the graph of the pixels of join2D, its label and its intensity (8 bits) instead of the whole stack
+            pixels, source, target, same_frame = pixel_graph(join)
+            pixel_labels = labeled_j2D.ravel()[pixels]
+            pixel_frames = pixels // (c * p)
+            intensity = np.concatenate([I.raw(i)[join[i] > 0] for i in range(f)]) * (255/65535)
+            del labeled_j2D
+
+            for min_size, max_size in product(min_size_values, max_size_values):
+                # Pixels of join3D, the objects with a size (+1) between the minimum and maximum size present in more than one frame
+                selected = (sizes > min_size - 1) & (sizes < max_size - 1) & (frames >= 2)
+                selected[0] = False
+                in_join3D = selected[pixel_labels]
+                max_segmented = np.max(intensity[in_join3D], initial=0)
+
+                for th_3d in th_3d_values:
+                    threshold_3d = th_3d*max_segmented
+
+                    # Objects of each frame bigger than the minimum surface
+                    active = in_join3D & (intensity > threshold_3d)
+                    edges = same_frame & active[source] & active[target]
+                    graph = coo_matrix((np.ones(np.count_nonzero(edges), dtype=bool), (source[edges], target[edges])), shape=(len(pixels), len(pixels)))
+                    objects_2d = connected_components(graph, directed=False)[1]
+                    in_join2D2 = active & (np.bincount(objects_2d, weights=active)[objects_2d] > ms2d)
+
+                    # 3D objects with a size (+1) between the minimum and maximum size present in more than one frame
+                    edges = in_join2D2[source] & in_join2D2[target]
+                    graph = coo_matrix((np.ones(np.count_nonzero(edges), dtype=bool), (source[edges], target[edges])), shape=(len(pixels), len(pixels)))
+                    objects_3d = connected_components(graph, directed=False)[1][in_join2D2]
+                    object_sizes = np.bincount(objects_3d, minlength=len(pixels))
+                    first_frame = np.full(len(pixels), f)
+                    last_frame = np.full(len(pixels), -1)
+                    np.minimum.at(first_frame, objects_3d, pixel_frames[in_join2D2])
+                    np.maximum.at(last_frame, objects_3d, pixel_frames[in_join2D2])
+                    num_objects_j3D2 = np.count_nonzero((object_sizes > min_size - 1) & (object_sizes < max_size - 1) & (last_frame - first_frame + 1 >= 2))
+
+                    rows.append({'Name': file_name,
+                                 'WS': ws,
+                                 'r': r,
+                                 'method': method,
+                                 'min_size_2d': ms2d,
+                                 'min_size': min_size,
+                                 'max_size': max_size,
+                                 'threshold_2d': th_2d,
+                                 'threshold_3d': th_3d,
+                                 'Objects_join2D': num_objects_j2D,
+                                 'Objects_join3D': np.count_nonzero(selected),
+                                 'Objects_join3D2': num_objects_j3D2})
+        del join2D
+
+    return rows
+
 def main():
     parser = argparse.ArgumentParser(
         description="""
@@ -170,49 +351,73 @@ and segments the objects after a preprocessing step.
     parser.add_argument('-ws',
                         '--window_size', 
                         type=int, 
-                        default=150, 
+                        default=[150], 
+                        nargs='+', 
                         help='Window size for local mean or median filter')
     parser.add_argument('-r',
                         '--r_factor', 
                         type=float, 
-                        default=1.5, 
+                        default=[1.5], 
+                        nargs='+', 
                         help='Factor for calculating the threshold in the filter')
     parser.add_argument('-method',
                         '--method', 
                         choices=['mean', 'median'], 
-                        default= 'mean', 
+                        default=['mean'], 
+                        nargs='+', 
                         help='Method for filtering')
     parser.add_argument('-min_surf',
                         '--minimum_surface', 
                         type=int, 
-                        default=16, 
+                        default=[16], 
+                        nargs='+', 
                         help='Minimum 2D surface of an object')
     parser.add_argument('-min_size',
                         '--minimum_size',
                         type=int, 
-                        default=150, 
+                        default=[150], 
+                        nargs='+', 
                         help='Minimum 3D volume of an object')
     parser.add_argument('-max_size',
                         '--maximum_size', 
                         type=int, 
-                        default=99999, 
+                        default=[99999], 
+                        nargs='+', 
                         help='Maximum 3D volume of an object')
     parser.add_argument('-th_2d',
                         '--threshold_2d', 
                         type=float, 
-                        default=0, 
+                        default=[0], 
+                        nargs='+', 
                         help='Minimum size of an object')
     parser.add_argument('-th_3d', 
-                        '--threshold_3d'
+                        '--threshold_3d',
                         type=float, 
-                        default=0.2, 
+                        default=[0.2], 
+                        nargs='+', 
                         help='Minimum size of an object')
+    parser.add_argument('-w',
+                        '--workers', 
+                        type=int, 
+                        default=1, 
+                        help='Number of images segmented in parallel')
+    parser.add_argument('-sweep',
+                        '--sweep', 
+                        action='store_true', 
+                        help='Segment with every combination of the given values of the parameters and save only the number of objects')
 
     # Parse the command-line arguments
     args = parser.parse_args()
 
+    grid = (args.window_size, args.r_factor, args.method, args.minimum_surface, args.minimum_size, args.maximum_size, args.threshold_2d, args.threshold_3d)
+
     # Call the function with the parsed arguments
-    segment(args.src_path, args.ws, args.r, args.method, args.min_surf, args.min_size, args.max_size, args.th1,  args.th2)
+    if args.sweep:
+        sweep(args.src_path, *grid, args.workers)
+    elif any(len(values) > 1 for values in grid):
+        parser.error("Several values of a parameter are only accepted with --sweep")
+    else:
+        segment(args.src_path, *[values[0] for values in grid], args.workers)
 
 
 
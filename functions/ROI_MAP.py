@@ -3,23 +3,29 @@ import numpy as np
 import pandas as pd
 from functions.apply_threshold_and_binarize import apply_threshold_and_binarize
 from functions.cmyk_to_rgb import cmyk_to_rgb
+from functions.roi_colors import roi_colors
 from tifffile import imwrite
 from pathlib import Path, PureWindowsPath
 
-def ROI_MAP(image:np.ndarray, 
-            image2:np.ndarray, 
-            df:pd.DataFrame, 
-            mask:np.ndarray, 
-            filename:str, 
-            PATH:str, 
+def ROI_MAP(image:np.ndarray,
+            image2:np.ndarray,
+            df:pd.DataFrame,
+            mask:np.ndarray,
+            filename:str,
+            PATH:str,
             th_percentage:float)->None:
     """
     Generate a map of regions of interest (ROIs) in image frames.
 
+    The color of every box is classified at once with a summed-area table of the mask projection
+    (the mean of the projection inside the box), the boxes are grouped by frame once and their edges
+    are drawn with array indexing. The map is rendered one frame at a time (8 bits) and streamed to
+    the output file, so the whole map is never held in memory.
+
     Parameters:
         image (numpy.ndarray): The first input image data (frame_n, x, y).
         image2 (numpy.ndarray): The second input image data (frame_n, x, y).
-        df (pandas.DataFrame): DataFrame containing ROI data (big_roi, Frame).
+        df (pandas.DataFrame): DataFrame containing ROI data (big_roi-0 to big_roi-3, Frame).
         mask (numpy.ndarray): The mask data (frame_n, x, y) for visual analysis.
         filename (str): The name of the output file.
         PATH (str): The path to the directory where the output file will be saved.
@@ -34,44 +40,55 @@ def ROI_MAP(image:np.ndarray,
 
     # ROI SIZE
     frame_n, x, y = image.shape
-    MAP = np.zeros((frame_n, x, y, 3))
-    Viz = np.zeros((frame_n, x, y, 4))
 
-    for frame in range(frame_n):
-        
-        Viz[frame, :, :, 0] = apply_threshold_and_binarize(image[frame, :, :], th_percentage)
-        Viz[frame, :, :, 1] = apply_threshold_and_binarize(image2[frame, :, :], th_percentage)
+    rois = df[["big_roi-0", "big_roi-1", "big_roi-2", "big_roi-3"]].to_numpy().astype(int).reshape(-1, 4)
+    frames = df["Frame"].to_numpy().astype(int)
+
+    # Skip the boxes too big to be drawn
+    keep = ~((rois[:, 1] - rois[:, 0] > 1000) | (rois[:, 3] - rois[:, 2] > 1000))
+    rois = rois[keep]
+    frames = frames[keep]
+    i_x, f_x, i_y, f_y = rois.T
+
+    # Box colors from the mean of the mask projection inside them
+    square_colors = roi_colors(rois, mask_projection)
+
+    # Edge pixels of every box: the columns i_y and f_y from i_x to f_x and the rows i_x and f_x from i_y to f_y
+    length_x = np.maximum(f_x - i_x, 0)
+    length_y = np.maximum(f_y - i_y, 0)
+    edge_starts = np.column_stack([i_x, i_x, i_y, i_y])
+    edge_lengths = np.column_stack([length_x, length_x, length_y, length_y])
+    edge_fixed = np.column_stack([i_y, f_y, i_x, f_x])
+
+    # Boxes of each frame, in the order of the DataFrame
+    order = np.argsort(frames, kind="stable")
+    bounds = np.searchsorted(frames[order], np.arange(frame_n + 1))
+
+    def render_frames():
+        for frame in range(frame_n):
+            Viz = np.zeros((x, y, 4), dtype=np.uint8)
+            Viz[:, :, 0] = apply_threshold_and_binarize(image[frame], th_percentage)
+            Viz[:, :, 1] = apply_threshold_and_binarize(image2[frame], th_percentage)
 
-        for roi, frame2 in zip(df["big_roi"], df["Frame"]):
-            
-            i_x = int(roi[0])
-            f_x = int(roi[1])
-            i_y = int(roi[2])
-            f_y = int(roi[3])
- 
-            if f_x - i_x > 1000 or f_y - i_y > 1000:
-                continue
+            boxes = order[bounds[frame]:bounds[frame + 1]]
+            if len(boxes) > 0:
+                # Positions along each edge and the fixed row or column of the edge
+                lengths = edge_lengths[boxes].ravel()
+                total = lengths.sum()
+                ends = np.cumsum(lengths)
+                along = np.arange(total) - np.repeat(ends - lengths, lengths) + np.repeat(edge_starts[boxes].ravel(), lengths)
+                fixed = np.repeat(edge_fixed[boxes].ravel(), lengths)
+                vertical = np.repeat(np.tile([True, True, False, False], len(boxes)), lengths)
+                rows = np.where(vertical, along, fixed)
+                columns = np.where(vertical, fixed, along)
+                pixel_box = np.repeat(np.repeat(boxes, 4), lengths)
 
-            if mask_projection[i_x:f_x, i_y:f_y].size > 0:
-                if np.mean(mask_projection[i_x:f_x, i_y:f_y]) > 1.5:
-                    square_color = [0, 0, 255, 0]
-                else:
-                    square_color = [0, 127, 255, 0]
-            else:
-                square_color = [255, 0, 0, 0]
-            
-            # DRAW BOX 
-            Viz[int(frame2), i_x:f_x, i_y, :] = square_color
-            Viz[int(frame2), i_x:f_x, f_y, :] = square_color
-            Viz[int(frame2), i_x, i_y:f_y, :] = square_color
-            Viz[int(frame2), f_x, i_y:f_y, :] = square_color
+                # The last box drawn on a pixel sets its color
+                flat = np.ravel_multi_index((rows, columns), (x, y))
+                last = len(flat) - 1 - np.unique(flat[::-1], return_index=True)[1]
+                Viz[rows[last], columns[last]] = square_colors[pixel_box[last]]
 
-        Cyan = Viz[frame, :, :, 0] 
-        Magenta = Viz[frame, :, :, 1]
-        Yellow = Viz[frame, :, :, 2]
-        Black = Viz[frame, :, :, 3]
-        PreMAP = cmyk_to_rgb(Cyan, Magenta, Yellow, Black)
-        MAP[frame,:,:,:] = PreMAP
+            yield cmyk_to_rgb(Viz[:, :, 0], Viz[:, :, 1], Viz[:, :, 2], Viz[:, :, 3])
 
     viz_filename = str(filename)+"ROI_MAP.tif"
-    imwrite(PATH / "ROI_MAPS" / viz_filename, MAP.astype(np.uint8))
+    imwrite(PATH / "ROI_MAPS" / viz_filename, render_frames(), shape=(frame_n, x, y, 3), dtype=np.uint8)
@@ -0,0 +1,34 @@
+import os
+import pandas as pd
+
+def append_csv(df:pd.DataFrame,
+               path:str)->None:
+    """
+    Append the rows of a DataFrame to a CSV file, writing the header only when the file is created.
+
+    The rows are written with the columns of the existing file, so the results can be saved in chunks
+    while they are calculated and the file is always a complete CSV that can be read if the process is
+    interrupted. If the DataFrame has columns that the file doesn't have (e.g. different channel names),
+    the file is rewritten once with the new columns, as pandas.concat would join them.
+
+    Parameters:
+        df (pandas.DataFrame): The rows to append.
+        path (str or Path): The path of the CSV file.
+
+    Returns:
+        None
+
+    Example:
+        >>> append_csv(pd.DataFrame.from_dict(data), PATH / results_file)
+    """
+    if not os.path.exists(path):
+        df.to_csv(path)
+        return
+
+    columns = pd.read_csv(path, index_col=0, nrows=0).columns
+    if df.columns.isin(columns).all():
+        df.reindex(columns=columns).to_csv(path, mode="a", header=False)
+    else:
+        # The saved rows are read as text, so their values are written back as they were
+        saved = pd.read_csv(path, index_col=0, dtype=str, keep_default_na=False)
+        pd.concat([saved, df]).to_csv(path)
@@ -0,0 +1,164 @@
+import os
+import hashlib
+import zipfile
+from functools import lru_cache
+import numpy as np
+
+@lru_cache(maxsize=256)
+def file_digest(filename:str,
+                size:int,
+                mtime_ns:int)->str:
+    """
+    Calculate the SHA-256 hash of the content of a file, reading it in blocks.
+
+    The size and modification time are part of the arguments so the hash of a file is calculated
+    once per process while the file isn't modified.
+
+    Parameters:
+        filename (str): The path of the file.
+        size (int): The size of the file in bytes.
+        mtime_ns (int): The modification time of the file in nanoseconds.
+
+    Returns:
+        str: The hexadecimal hash of the file content.
+
+    Example:
+        >>> status = os.stat(filename)
+        >>> file_digest(str(filename), status.st_size, status.st_mtime_ns)
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ArtifactCache:
+    """
+    On-disk cache of the intermediate results (filtered stacks, label images, object proprieties...) of an image.
+
+    The entries are addressed by the content of the input image (its hash, not its name or location), the name
+    of the processing stage and its parameters, so any script reading the same image with the same parameters
+    reuses the entry, and changing a parameter that the stage doesn't use doesn't recalculate it. Each entry is
+    a compressed numpy file (.npz) of named arrays, written to a temporary file and renamed once complete, so
+    several processes can share the cache. When the cache is bigger than its maximum size, the entries used
+    least recently are removed.
+
+    Parameters:
+        directory (str or Path): The directory of the cache, created if it doesn't exist.
+        max_bytes (int, optional): Maximum size of the cache in bytes (default: 2 GB).
+
+    Example:
+        >>> cache = ArtifactCache(PATH / "Cache")
+        >>> key = cache.key(PATH / Filegroup[0], "largest_objects", th_percent=0.2)
+        >>> entry = cache.get(key)
+        >>> if entry is None:
+        ...     cache.put(key, {"labeled": labeled, "area": area})
+    """
+    def __init__(self,
+                 directory,
+                 max_bytes:int = 2 * 2**30):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self,
+            filename,
+            stage:str,
+            **parameters)->str:
+        """
+        Generate the key of an entry from the content of the input file, the stage and its parameters.
+
+        Parameters:
+            filename (str or Path): The input image of the stage.
+            stage (str): The name of the processing stage.
+            **parameters: The parameters of the stage (numbers, strings or numpy arrays).
+
+        Returns:
+            str: The hexadecimal key of the entry.
+        """
+        status = os.stat(filename)
+        digest = hashlib.sha256()
+        digest.update(file_digest(os.path.abspath(filename), status.st_size, status.st_mtime_ns).encode())
+        digest.update(stage.encode())
+        for name, value in sorted(parameters.items()):
+            if isinstance(value, np.ndarray):
+                value = (value.dtype.str, value.shape, hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest())
+            digest.update(repr((name, value)).encode())
+        return digest.hexdigest()
+
+    def get(self,
+            key:str)->dict:
+        """
+        Read an entry of the cache and mark it as recently used.
+
+        Parameters:
+            key (str): The key of the entry.
+
+        Returns:
+            dict: The arrays of the entry by name, or None if the entry doesn't exist or can't be read.
+        """
+        path = os.path.join(self.directory, key + ".npz")
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+        return arrays
+
+    def put(self,
+            key:str,
+            arrays:dict)->None:
+        """
+        Save an entry on the cache and remove the entries used least recently if the cache is too big.
+
+        Parameters:
+            key (str): The key of the entry.
+            arrays (dict): The arrays of the entry by name.
+
+        Returns:
+            None
+        """
+        path = os.path.join(self.directory, key + ".npz")
+        temporary_file = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_file, "wb") as file:
+                np.savez_compressed(file, **arrays)
+            os.replace(temporary_file, path)
+        except BaseException:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            raise
+        self.evict(keep=path)
+
+    def evict(self,
+              keep:str = None)->None:
+        """
+        Remove the entries used least recently until the cache isn't bigger than its maximum size.
+
+        Parameters:
+            keep (str, optional): The path of an entry that is not removed (the last one saved).
+
+        Returns:
+            None
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                try:
+                    status = entry.stat()
+                except OSError:
+                    continue
+                entries.append((status.st_mtime_ns, status.st_size, entry.path))
+
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,77 @@
+import queue
+import threading
+import numpy as np
+from tifffile import imwrite
+
+class AsyncImageWriter:
+    """
+    Write TIFF images from a background thread so the processing doesn't wait for the storage.
+
+    The images are queued and written in the order they were submitted. The queue is bounded, so
+    the processing only waits when the storage can't keep up and the memory used by the pending
+    images stays limited.
+
+    Parameters:
+        max_pending (int, optional): Maximum number of images waiting to be written (default: 64).
+
+    Example:
+        >>> with AsyncImageWriter() as writer:
+        ...     writer.imwrite(PATH / "Filtered" / im_name, closing.astype(np.uint8))
+    """
+    def __init__(self, max_pending:int = 64):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._errors = []
+        self._thread = threading.Thread(target=self._write_images, daemon=True)
+        self._thread.start()
+
+    def _write_images(self):
+        # Write the queued images until the end signal (None) is received
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            filename, data, kwargs = item
+            try:
+                imwrite(filename, data, **kwargs)
+            except Exception as error:
+                self._errors.append((filename, error))
+
+    def imwrite(self, filename, data:np.ndarray, **kwargs):
+        """
+        Queue an image to be written with tifffile.imwrite.
+
+        The data is written as it is when the image is written, so it must not be modified after submitting it.
+
+        Parameters:
+            filename (str or Path): The name of the file to write.
+            data (numpy.ndarray): The image data.
+            **kwargs: Keyword arguments passed to tifffile.imwrite (e.g. imagej=True).
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("The writer is closed")
+        self._queue.put((filename, data, kwargs))
+
+    def close(self):
+        """
+        Wait until every queued image is written and stop the background thread.
+
+        Raises:
+            OSError: If any of the images could not be written.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._errors:
+            filename, error = self._errors[0]
+            raise OSError(f"{len(self._errors)} images could not be written, first {filename}: {error}") from error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Don't hide the error that interrupted the processing with the writing errors
+        try:
+            self.close()
+        except OSError:
+            if exc_type is None:
+                raise
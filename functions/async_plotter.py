@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+def use_agg_backend():
+    # Non-interactive backend for the plotting processes, the figures are only saved
+    import matplotlib
+    matplotlib.use("Agg")
+
+class AsyncPlotter:
+    """
+    Render and save plots on background processes so the analysis doesn't wait for matplotlib.
+
+    The plotting functions are run on a process pool with the non-interactive Agg backend, in parallel
+    with the analysis. The number of plots waiting or being rendered is bounded, so the analysis only
+    waits when the plotting can't keep up and the memory used by the pending plots stays limited.
+
+    Parameters:
+        workers (int, optional): Number of plotting processes, 0 to plot on the calling thread (default: 1).
+        max_pending (int, optional): Maximum number of plots waiting or being rendered (default: 8).
+
+    Example:
+        >>> with AsyncPlotter(workers=2) as plotter:
+        ...     plotter.plot(plot_distance_frame, A, B, COM_A, COM_B, "", "", overlap, COM_Dist_um, Per_Dist_um, PATH / "VIZ" / file_name)
+    """
+    def __init__(self, workers:int = 1, max_pending:int = 8):
+        self._max_pending = max(max_pending, 1)
+        self._pending = deque()
+        self._errors = []
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=use_agg_backend) if workers > 0 else None
+        self._closed = False
+
+    def _collect(self, future):
+        try:
+            future.result()
+        except Exception as error:
+            self._errors.append(error)
+
+    def plot(self, function, *args, **kwargs):
+        """
+        Queue a plot, function(*args, **kwargs) is called on a plotting process.
+
+        The function and its arguments are sent to the plotting process, so they must be picklable
+        (a function defined at module level and small arrays, e.g. the labels of the frame).
+
+        Parameters:
+            function (callable): The function that renders and saves the plot.
+            *args, **kwargs: Arguments passed to the function.
+        """
+        if self._closed:
+            raise RuntimeError("The plotter is closed")
+
+        if self._executor is None:
+            try:
+                function(*args, **kwargs)
+            except Exception as error:
+                self._errors.append(error)
+            return
+
+        # Wait for the oldest plots when the maximum number of pending plots is reached
+        while len(self._pending) >= self._max_pending:
+            self._collect(self._pending.popleft())
+        self._pending.append(self._executor.submit(function, *args, **kwargs))
+
+    def close(self):
+        """
+        Wait until every queued plot is saved and stop the plotting processes.
+
+        Raises:
+            RuntimeError: If any of the plots could not be rendered.
+        """
+        if not self._closed:
+            self._closed = True
+            while self._pending:
+                self._collect(self._pending.popleft())
+            if self._executor is not None:
+                self._executor.shutdown()
+        if self._errors:
+            error = self._errors[0]
+            raise RuntimeError(f"{len(self._errors)} plots could not be rendered, first: {type(error).__name__}: {error}") from error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Don't hide the error that interrupted the analysis with the plotting errors
+        try:
+            self.close()
+        except RuntimeError:
+            if exc_type is None:
+                raise
@@ -1,48 +1,146 @@
 import numpy as np
-from math import sqrt
+from scipy.ndimage import binary_erosion, generate_binary_structure
+from scipy.spatial import cKDTree
 
-def calculate_per_dist(POS_A:list, 
+def boundary_points(POS:np.ndarray)->np.ndarray:
+    """
+    Keep only the points of an object that lie on its boundary.
+
+    A point is on the boundary when any of its 4 neighbours does not belong to the object.
+
+    Parameters:
+        POS (numpy.ndarray): Array of (X, Y) coordinates of the points of the object.
+
+    Returns:
+        numpy.ndarray: The boundary points, in the same order they were given.
+    """
+    if len(POS) == 0:
+        return POS
+
+    # Draw the object on a small canvas with 1 pixel of margin around it
+    origin = POS.min(axis=0) - 1
+    local = POS - origin
+    canvas = np.zeros(local.max(axis=0) + 2, dtype=bool)
+    canvas[local[:, 0], local[:, 1]] = True
+
+    # Remove the points whose 4 neighbours belong to the object
+    interior = binary_erosion(canvas, structure=generate_binary_structure(2, 1))
+    return POS[~interior[local[:, 0], local[:, 1]]]
+
+def nearest_squared(tree:cKDTree,
+                    points:np.ndarray,
+                    tree_points:np.ndarray,
+                    bound:float = np.inf)->np.ndarray:
+    """
+    Squared distance from each point to its nearest point of a KD-tree, only for the points within a bound.
+
+    The points out of the bounding box of the tree points expanded by the bound are not searched and the
+    search of the rest stops at the bound.
+
+    Parameters:
+        tree (scipy.spatial.cKDTree): KD-tree of the points of the object.
+        points (numpy.ndarray): Array of (X, Y) coordinates of the points to search.
+        tree_points (numpy.ndarray): The (X, Y) coordinates of the points of the tree.
+        bound (float, optional): Maximum squared distance searched (default: no maximum).
+
+    Returns:
+        numpy.ndarray: The squared distances (integers), the maximum int64 value for the points further than the bound.
+    """
+    squared = np.full(len(points), np.iinfo(np.int64).max)
+
+    close = np.ones(len(points), dtype=bool)
+    upper_bound = np.inf
+    if np.isfinite(bound):
+        radius = np.sqrt(bound)
+        close = np.all((points >= tree_points.min(axis=0) - radius) & (points <= tree_points.max(axis=0) + radius), axis=1)
+        upper_bound = radius + 1e-6
+
+    distance, nearest = tree.query(points[close], k=1, distance_upper_bound=upper_bound)
+    found = np.isfinite(distance)
+    squared[np.flatnonzero(close)[found]] = np.sum((points[close][found] - tree_points[nearest[found]]) ** 2, axis=-1)
+    return squared
+
+def calculate_per_dist(POS_A:list,
                        POS_B:list,
-                       elements:int = 5)->list:
+                       elements:int = 5,
+                       boundary_only:bool = False)->list:
     """
     Calculate the minimum Euclidean distance between two sets of points.
 
+    The points of set B are indexed in a KD-tree and only the nearest neighbours of each point
+    of set A are compared, so the pairs of points are never enumerated.
+
+    When the sets don't overlap, the nearest point of an object to any point outside it is on its
+    boundary, so the distances are first searched between the boundaries only. The N smallest of them
+    bound the distance of the N nearest pairs of points, and only the points of each set within the
+    bound of the other set are compared. The results are the same as comparing every point.
+
     Parameters:
-        POS_A (list of tuples): List of (X, Y) coordinates for points in set A.
-        POS_B (list of tuples): List of (X, Y) coordinates for points in set B.
+        POS_A (list of tuples or numpy.ndarray): List of (X, Y) coordinates for points in set A.
+        POS_B (list of tuples or numpy.ndarray): List of (X, Y) coordinates for points in set B.
+        elements (int, optional): Number of nearest pairs of points to average (default: 5).
+        boundary_only (bool, optional): Only use the boundary points of each set (default: False).
+            The minimum distance does not change, but the nearest points and the average may.
 
     Returns:
         list: A list containing the following elements:
             - The minimum Euclidean distance between any pair of points.
             - The (X, Y) coordinates of the nearest point in set A.
             - The (X, Y) coordinates of the nearest point in set B.
+            - The average distance of the N nearest pairs of points.
 
     Example:
         POS_A = [(1, 2), (3, 4), (5, 6)]
         POS_B = [(2, 2), (4, 4), (7, 7)]
         result = calculate_per_dist(POS_A, POS_B)
-        # Output: [1.0, (1, 2), (2, 2)]
+        # Output: [1.0, [1, 2], [2, 2], 1.7416...]
 
     Note:
-        - If only one object is found in either set A or B, the minimum distance will be "ONLY 1 OBJECT FOUND".
+        - If set A or B is empty, the minimum distance will be "ONLY 1 OBJECT FOUND".
+        - When several pairs of points share the minimum distance, the first one found iterating
+          through set A and then set B is returned.
     """
-    Distances = []
-    A_points = []
-    B_points = []
-    for PA in POS_A:
-        XA, YA = PA[0], PA[1]
-        for PB in POS_B:
-            XB, YB = PB[0], PB[1]
-            VAR_X = XA - XB if XA > XB else XB - XA
-            VAR_Y = YA - YB if  YA > YB else YB - YA
-            A_points.append([XA,YA])
-            B_points.append([XB, YB])
-            Distances.append(sqrt(VAR_X**2 + VAR_Y**2))
-    
-    avg_min_dist = sum(sorted(Distances, key=lambda x: x)[:elements])/elements
-    output = [min(Distances) if len(Distances) > 0 else "ONLY 1 OBJECT FOUND"]
-    min_distance_indices = np.where(Distances == np.min(Distances))[0][0]
-    output.append(A_points[min_distance_indices])
-    output.append(B_points[min_distance_indices])
-    output.append(avg_min_dist)
-    return output
\ No newline at end of file
+    A = np.asarray(POS_A, dtype=np.int64).reshape(-1, 2)
+    B = np.asarray(POS_B, dtype=np.int64).reshape(-1, 2)
+
+    if boundary_only:
+        A = boundary_points(A)
+        B = boundary_points(B)
+
+    if len(A) == 0 or len(B) == 0:
+        return ["ONLY 1 OBJECT FOUND", "", "", "ONLY 1 OBJECT FOUND"]
+
+    # Without overlap, keep only the points near enough to the other set to be in the N nearest pairs
+    width = max(A[:, 1].max(), B[:, 1].max()) + 1
+    if not np.any(np.isin(A[:, 0] * width + A[:, 1], B[:, 0] * width + B[:, 1])):
+        A_edge = boundary_points(A)
+        B_edge = boundary_points(B)
+        tree_A = cKDTree(A_edge)
+        tree_B = cKDTree(B_edge)
+
+        # Each boundary point of set A and its nearest point of set B are a pair, so the N-th smallest is a bound
+        edge_squared = nearest_squared(tree_B, A_edge, B_edge)
+        bound = np.partition(edge_squared, elements - 1)[elements - 1] if len(edge_squared) >= elements else np.inf
+
+        A = A[nearest_squared(tree_B, A, B_edge, bound) <= bound]
+        B = B[nearest_squared(tree_A, B, A_edge, bound) <= bound]
+
+    # The N nearest pairs of points are among the N nearest neighbours of each point of set A
+    k = min(elements, len(B))
+    neighbours = cKDTree(B).query(A, k=k)[1].reshape(len(A), k)
+
+    # Squared distances are integers, so they are compared exactly
+    squared = np.sum((A[:, np.newaxis, :] - B[neighbours]) ** 2, axis=-1)
+
+    # First point of set A at the minimum distance and its first point of set B at that distance
+    a_index = np.argmin(squared[:, 0])
+    b_index = np.argmin(np.sum((B - A[a_index]) ** 2, axis=-1))
+    min_distance = float(np.sqrt(squared[a_index, 0]))
+
+    # Average of the N smallest distances (partial selection instead of sorting every distance)
+    squared = squared.ravel()
+    if len(squared) > elements:
+        squared = np.partition(squared, elements - 1)[:elements]
+    avg_min_dist = sum(np.sqrt(np.sort(squared)).tolist())/elements
+
+    return [min_distance, A[a_index].tolist(), B[b_index].tolist(), avg_min_dist]
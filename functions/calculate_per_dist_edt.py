@@ -0,0 +1,94 @@
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from scipy.spatial import cKDTree
+from functions.calculate_per_dist import boundary_points
+
+def calculate_per_dist_edt(POS_A:list,
+                           POS_B:list,
+                           elements:int = 5,
+                           boundary_only:bool = False)->list:
+    """
+    Calculate the minimum Euclidean distance between two sets of points with a distance transform.
+
+    Set B is drawn on the bounding box of the 2 sets (the ROI of the pair) and a single Euclidean distance
+    transform of its complement gives, for every pixel, its nearest point of set B (index output). The distance
+    and the nearest point of set B of each point of set A are read from it, so the cost depends on the size of
+    the box and not on the number of pairs of points. The nearest point of set B of each point of set A are N
+    pairs of points, so the N-th smallest of those distances bounds the distance of the N nearest pairs: only the
+    points of set A within the bound and the points of set B around them are compared, with the N nearest
+    neighbours of each point, to obtain the average. The results are the same as calculate_per_dist.
+
+    Parameters:
+        POS_A (list of tuples or numpy.ndarray): List of (X, Y) coordinates for points in set A.
+        POS_B (list of tuples or numpy.ndarray): List of (X, Y) coordinates for points in set B.
+        elements (int, optional): Number of nearest pairs of points to average (default: 5).
+        boundary_only (bool, optional): Only use the boundary points of each set, as calculate_per_dist (default: False).
+
+    Returns:
+        list: A list containing the following elements:
+            - The minimum Euclidean distance between any pair of points.
+            - The (X, Y) coordinates of the nearest point in set A.
+            - The (X, Y) coordinates of the nearest point in set B.
+            - The average distance of the N nearest pairs of points.
+
+    Example:
+        >>> POS_A = [(1, 2), (3, 4), (5, 6)]
+        >>> POS_B = [(2, 2), (4, 4), (7, 7)]
+        >>> calculate_per_dist_edt(POS_A, POS_B)
+        [1.0, [1, 2], [2, 2], 1.741640786499874]
+        >>> from functions.calculate_per_dist import calculate_per_dist
+        >>> calculate_per_dist_edt(POS_A, POS_B, 3) == calculate_per_dist(POS_A, POS_B, 3)
+        True
+
+    Note:
+        - If set A or B is empty, the minimum distance will be "ONLY 1 OBJECT FOUND".
+        - When several pairs of points share the minimum distance, the first one found iterating
+          through set A and then set B is returned.
+    """
+    A = np.asarray(POS_A, dtype=np.int64).reshape(-1, 2)
+    B = np.asarray(POS_B, dtype=np.int64).reshape(-1, 2)
+
+    if boundary_only:
+        A = boundary_points(A)
+        B = boundary_points(B)
+
+    if len(A) == 0 or len(B) == 0:
+        return ["ONLY 1 OBJECT FOUND", "", "", "ONLY 1 OBJECT FOUND"]
+
+    # Draw set B on the bounding box of both sets
+    origin = np.minimum(A.min(axis=0), B.min(axis=0))
+    local_A = A - origin
+    local_B = B - origin
+    shape = np.maximum(local_A.max(axis=0), local_B.max(axis=0)) + 1
+    outside_B = np.ones(shape, dtype=bool)
+    outside_B[local_B[:, 0], local_B[:, 1]] = False
+
+    # Nearest point of set B of each point of set A from the index output, and its squared distance (integers, compared exactly)
+    nearest = distance_transform_edt(outside_B, return_distances=False, return_indices=True)
+    nearest_B = nearest[:, local_A[:, 0], local_A[:, 1]].T
+    squared = np.sum((local_A - nearest_B) ** 2, axis=-1)
+
+    # First point of set A at the minimum distance and its first point of set B at that distance
+    a_index = np.argmin(squared)
+    b_index = np.argmin(np.sum((B - A[a_index]) ** 2, axis=-1))
+    min_distance = float(np.sqrt(squared[a_index]))
+
+    # The nearest point of set B of each point of set A are N pairs of points, so the N-th smallest is a bound
+    bound = np.partition(squared, elements - 1)[elements - 1] if len(squared) >= elements else np.inf
+    A_close = A[squared <= bound]
+    B_close = B
+    if np.isfinite(bound):
+        radius = np.sqrt(bound)
+        B_close = B[np.all((B >= A_close.min(axis=0) - radius) & (B <= A_close.max(axis=0) + radius), axis=1)]
+
+    # The N nearest pairs of points are among the N nearest neighbours of each point of set A within the bound
+    k = min(elements, len(B_close))
+    neighbours = cKDTree(B_close).query(A_close, k=k)[1].reshape(len(A_close), k)
+    pairs = np.sum((A_close[:, np.newaxis, :] - B_close[neighbours]) ** 2, axis=-1).ravel()
+
+    # Average of the N smallest distances (partial selection instead of sorting every distance)
+    if len(pairs) > elements:
+        pairs = np.partition(pairs, elements - 1)[:elements]
+    avg_min_dist = sum(np.sqrt(np.sort(pairs)).tolist())/elements
+
+    return [min_distance, A[a_index].tolist(), B[b_index].tolist(), avg_min_dist]
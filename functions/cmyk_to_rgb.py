@@ -1,11 +1,13 @@
 import numpy as np
+from functools import lru_cache
 
 def cmyk_to_rgb(c:np.ndarray, 
                 m:np.ndarray, 
                 y:np.ndarray, 
                 k:np.ndarray, 
                 cmyk_scale:int = 255, 
-                rgb_scale:int = 255) -> np.ndarray:
+                rgb_scale:int = 255,
+                out:np.ndarray = None) -> np.ndarray:
 
     """
     Convert CMYK color values to RGB color values.
@@ -15,6 +17,14 @@ def cmyk_to_rgb(c:np.ndarray,
     [0, cmyk_scale], where cmyk_scale is the maximum value for CMYK components.
     The resulting RGB values are returned as a NumPy array.
 
+    The components can have any shape (a frame, a whole stack...), the RGB array has the same
+    shape with the 3 colors on the last axis. When the components are 8 bits (uint8), the
+    conversion of each color is read from a lookup table of the color and black components,
+    with the same values as the floating point calculation. Each color is read with np.take into
+    a contiguous buffer that is reused for the 3 colors and copied to its channel of the output, so
+    no temporary arrays are allocated per color. Other types are converted with the floating point
+    calculation.
+
     Args:
         c (array): Cyan component of the CMYK color.
         m (array): Magenta component of the CMYK color.
@@ -22,17 +32,19 @@ def cmyk_to_rgb(c:np.ndarray,
         k (array): Black component of the CMYK color.
         cmyk_scale (int, optional): Maximum value for CMYK components. Default is 255.
         rgb_scale (int, optional): Maximum value for RGB components. Default is 255.
+        out (numpy.ndarray, optional): Array (uint8) where the RGB values are written, with the shape
+            of the components and 3 colors on the last axis. Default is None (a new array).
 
     Returns:
         numpy.ndarray: An RGB array representing the converted color array.
 
     Example:
-        c = 100
-        m = 50
-        y = 0
-        k = 0
+        c = np.array([100], dtype=np.uint8)
+        m = np.array([50], dtype=np.uint8)
+        y = np.array([0], dtype=np.uint8)
+        k = np.array([0], dtype=np.uint8)
         rgb_color = cmyk_to_rgb(c, m, y, k)
-        print(rgb_color)  # Output: [127 191 255]
+        print(rgb_color)  # Output: [[155 205 255]]
 
     Note:
         This function assumes that the input CMYK values are within the specified range.
@@ -42,12 +54,49 @@ def cmyk_to_rgb(c:np.ndarray,
         Original JavaScript implementation: http://www.javascripter.net/faq/rgb2cmyk.htm
     """
 
-    r = rgb_scale * (1.0 - c / float(cmyk_scale)) * (1.0 - k / float(cmyk_scale))
-    g = rgb_scale * (1.0 - m / float(cmyk_scale)) * (1.0 - k / float(cmyk_scale))
-    b = rgb_scale * (1.0 - y / float(cmyk_scale)) * (1.0 - k / float(cmyk_scale))
+    c, m, y, k = (np.asarray(component) for component in (c, m, y, k))
+    if out is None:
+        out = np.empty(np.broadcast_shapes(c.shape, m.shape, y.shape, k.shape) + (3,), dtype=np.uint8)
+
+    if all(component.dtype == np.uint8 for component in (c, m, y, k)):
+        # Each color only depends on its component and the black component (flat index component * 256 + black)
+        table = cmyk_table(cmyk_scale, rgb_scale).ravel()
+        index = np.empty(out.shape[:-1], dtype=np.uint16)
+        channel = np.empty(out.shape[:-1], dtype=np.uint8)
+        for color, component in enumerate((c, m, y)):
+            np.left_shift(component, 8, out=index, dtype=np.uint16)
+            index |= k
+
+            # The indices are always inside the table, so they are not checked and the buffer is written directly
+            np.take(table, index, out=channel, mode='clip')
+            out[..., color] = channel
+    else:
+        # Each color is written on its channel of the RGB array (cast to 8 bits as astype(np.uint8))
+        black = 1.0 - k / float(cmyk_scale)
+        for color, component in enumerate((c, m, y)):
+            out[..., color] = rgb_scale * (1.0 - component / float(cmyk_scale)) * black
 
-    rgb = np.array([r, g, b], dtype=np.uint8).transpose(1,2,0)  # Create the RGB array
-    mask = np.all(rgb == [255, 255, 255], axis=-1)  # Identify white pixels
-    rgb[mask] = [0, 0, 0]
+    mask = (out[..., 0] == 255) & (out[..., 1] == 255) & (out[..., 2] == 255)  # Identify white pixels
+    out[mask] = 0
+
+    return out
+
+@lru_cache(maxsize=None)
+def cmyk_table(cmyk_scale:int = 255,
+               rgb_scale:int = 255) -> np.ndarray:
+    """
+    Lookup table of the RGB value of a color component and the black component of 8 bits CMYK colors.
 
-    return rgb
\ No newline at end of file
+    Parameters:
+        cmyk_scale (int, optional): Maximum value for CMYK components. Default is 255.
+        rgb_scale (int, optional): Maximum value for RGB components. Default is 255.
+
+    Returns:
+        numpy.ndarray: The RGB value (uint8) of every pair of color and black components (256, 256).
+    """
+    component = np.arange(256, dtype=np.uint8)
+    color, black = component[:, np.newaxis], component[np.newaxis, :]
+    table = rgb_scale * (1.0 - color / float(cmyk_scale)) * (1.0 - black / float(cmyk_scale))
+    table = table.astype(np.uint8)
+    table.flags.writeable = False
+    return table
@@ -1,4 +1,5 @@
 import numpy as np
+from functions.draw_lines import draw_lines
 
 def combine_and_draw(image:np.ndarray, 
                      point1:tuple, 
@@ -18,24 +19,5 @@ def combine_and_draw(image:np.ndarray,
     """
     canvas = image.copy()
 
-    y1, x1 = map(int, point1)
-    y2, x2 = map(int, point2)
-
     # Bresenham's line algorithm to calculate the line pixels
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
-    sx = -1 if x1 > x2 else 1
-    sy = -1 if y1 > y2 else 1
-    err = dx - dy
-
-    while x1 != x2 or y1 != y2:
-        canvas[y1, x1, :] = color
-        e2 = 2 * err
-        if e2 > -dy:
-            err -= dy
-            x1 += sx
-        if e2 < dx:
-            err += dx
-            y1 += sy
-    
-    return canvas
\ No newline at end of file
+    return draw_lines(canvas, [point1], [point2], color)
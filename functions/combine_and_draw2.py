@@ -1,4 +1,5 @@
 import numpy as np
+from functions.draw_lines import draw_lines
 
 
 
@@ -39,31 +40,12 @@ def combine_and_draw2(image1:np.ndarray,
     combined_image[:, :, 2] = 0
     combined_image[:, :, 3] = 0
 
-    # Add red pixels at the specified points
-    y1, x1 = map(int, point1)
-    y2, x2 = map(int, point2)
+    # Draw the line between the points (Bresenham's line algorithm)
+    # White would be 0,0,0,0, but it would be set black like the background
+    # when changing cmyk to rgb so i had do make it pseudo-white
+    draw_lines(combined_image, [point1], [point2], [1, 1, 1, 0])
     ay1, ax1 = map(int, point1)
     ay2, ax2 = map(int, point2)
-
-    # We'll use Bresenham's line algorithm to calculate the line pixels
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
-    sx = -1 if x1 > x2 else 1
-    sy = -1 if y1 > y2 else 1
-    err = dx - dy
-
-    while x1 != x2 or y1 != y2:
-        combined_image[y1, x1, :] = [1, 1, 1, 0]# White would be 0,0,0,0, but 
-                                                # it would be set black like the background
-                                                # when changing cmyk to rgb so i had do make
-                                                # it pseudo-white
-        e2 = 2 * err
-        if e2 > -dy:
-            err -= dy
-            x1 += sx
-        if e2 < dx:
-            err += dx
-            y1 += sy
     
     # Set starting and ending piont as yellow
     if yellow_center:
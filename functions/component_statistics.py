@@ -0,0 +1,47 @@
+import numpy as np
+from itertools import chain
+from operator import attrgetter
+from scipy.ndimage import find_objects
+
+def component_statistics(image_labeled:np.ndarray,
+                         num_labels:int = None)->tuple:
+    """
+    Calculate the area, number of frames and bounding box of every object of a labeled image at once.
+
+    The areas are the histogram of the labels and the bounding boxes are obtained with a single
+    find_objects pass, so no object is iterated as a python object. Every statistic is an array indexed
+    by the label (the background is the label 0), so it can be used as a lookup table of the labeled image.
+
+    Parameters:
+        image_labeled (numpy.ndarray): Image with the objects labeled (background as 0).
+        num_labels (int, optional): Highest label of the image (default: None, the maximum of the image).
+
+    Returns:
+        tuple: A tuple containing:
+            - area (numpy.ndarray): Number of pixels of each label.
+            - frames (numpy.ndarray): Number of frames (first axis) between the first and last frame of each label,
+              the number of distinct frames of a connected object (0 for missing labels).
+            - bbox (numpy.ndarray): Bounding box of each label as (start of each axis..., stop of each axis...),
+              with the stops excluded (0 for missing labels).
+
+    Example:
+        >>> labeled_j2D, num_objects_j2D = label(join2D, structure=np.ones((3, 3, 3)))
+        >>> area, frames, bbox = component_statistics(labeled_j2D, num_objects_j2D)
+        >>> join3D = ((area > 149) & (frames >= 2))[labeled_j2D]
+    """
+    ndim = image_labeled.ndim
+    boxes = find_objects(image_labeled, num_labels) if num_labels is not None else find_objects(image_labeled)
+    num_labels = len(boxes)
+
+    area = np.bincount(image_labeled.ravel(), minlength=num_labels + 1)
+
+    # Start and stop of every axis of every label (missing labels as empty boxes at 0)
+    empty = (slice(0, 0),) * ndim
+    axes = list(chain.from_iterable(box or empty for box in boxes))
+    bbox = np.zeros((num_labels + 1, ndim * 2), dtype=np.intp)
+    bbox[1:, :ndim] = np.fromiter(map(attrgetter('start'), axes), dtype=np.intp, count=len(axes)).reshape(num_labels, ndim)
+    bbox[1:, ndim:] = np.fromiter(map(attrgetter('stop'), axes), dtype=np.intp, count=len(axes)).reshape(num_labels, ndim)
+
+    frames = bbox[:, ndim] - bbox[:, 0]
+
+    return area, frames, bbox
@@ -0,0 +1,35 @@
+import numpy as np
+from scipy.ndimage import label, generate_binary_structure
+
+def count_objects_per_frame(image:np.ndarray,
+                            frame_structure:np.ndarray = None)->np.ndarray:
+    """
+    Count the objects of each frame of a stack with 2D connectivity in a single labeling of the stack.
+
+    The stack is labeled with a structure without connectivity between frames, so each object
+    belongs to a single frame. The labels are assigned frame by frame in increasing order, so the
+    objects of each frame are the new labels since the previous frame.
+
+    Parameters:
+        image (numpy.ndarray): The segmented stack (frames, x, y).
+        frame_structure (numpy.ndarray, optional): 3x3 structuring element of the 2D connectivity (default: 4-connectivity).
+
+    Returns:
+        numpy.ndarray: The number of objects of each frame.
+
+    Example:
+        >>> counts = count_objects_per_frame(image > 0)
+        >>> counts[3]  # Number of objects on the frame 3
+    """
+    if frame_structure is None:
+        frame_structure = generate_binary_structure(2, 1)
+
+    # Structure with the 2D connectivity on the central frame only
+    structure = np.zeros((3,) + np.shape(frame_structure), dtype=bool)
+    structure[1] = frame_structure
+
+    labeled, _ = label(image, structure)
+
+    # Highest label reached at each frame (frames without objects keep the previous one)
+    last_label = np.maximum.accumulate(labeled.reshape(len(labeled), -1).max(axis=1, initial=0))
+    return np.diff(last_label, prepend=0)
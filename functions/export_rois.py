@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from tifffile import TiffWriter
+from pathlib import Path, PureWindowsPath
+from functions.cmyk_to_rgb import cmyk_to_rgb
+
+def export_rois(image:np.ndarray,
+                image2:np.ndarray,
+                df:pd.DataFrame,
+                filename:str,
+                PATH:str,
+                max_size:int = 200,
+                batch_bytes:int = 256 * 2**20)->pd.DataFrame:
+    """
+    Save the regions of interest (ROIs) of the pairs of close objects of an image in a single multi-series TIFF file.
+
+    The ROIs are the boxes around the pairs of objects (big_roi), cropped on every frame of the stack.
+    The repeated boxes and the boxes inside a bigger box (of any frame, the crops are taken on every frame)
+    are saved once, as the bigger box; the containment is tested in blocks of boxes sorted by area. Each frame is
+    read and converted to RGB once (the channels in cyan and magenta) on a canvas and an RGB buffer reused for
+    every frame, and all the crops are taken from it, so the cost doesn't grow with the depth of the stack times
+    the number of pairs. The centroids of the pairs of each series (the pair of the box and the pairs of the boxes
+    inside it) are marked in yellow on every frame of its crop. Each saved box is a series (frames, x, y, RGB)
+    of the TIFF file and an index CSV file relates every pair to its series.
+
+    Parameters:
+        image (ImageStack or numpy.ndarray): The first input image data (frame_n, x, y), normalized to 255.
+        image2 (ImageStack or numpy.ndarray): The second input image data (frame_n, x, y), normalized to 255.
+        df (pandas.DataFrame): Detection results (Frame, com-0, com-1, com2-0, com2-1, big_roi-0 to big_roi-3).
+        filename (str): The name of the image, used for the output files.
+        PATH (str): The path to the directory where the ROIs directory is.
+        max_size (int, optional): Boxes with a side bigger than this are not saved (default: 200).
+        batch_bytes (int, optional): Maximum memory used by the crops before they are written, the frames
+            are read once per batch of crops (default: 256 MB).
+
+    Returns:
+        pandas.DataFrame: The index of the saved ROIs, one row per pair: its row on the results (Result_row),
+        Frame, Pair (number of the pair on the image, Result_row + 1), the box (big_roi-0 to big_roi-3), the series of the TIFF
+        file (Series), the box of the series (Series_roi-0 to Series_roi-3) and the position of the box on the
+        crop of the series (Offset-0, Offset-1).
+
+    Example:
+        >>> export_rois(image, image2, df, Filegroup[0], PATH)
+        # Output: ROIs/image_ROIs.tif and ROIs/image_ROIs.csv
+    """
+    Wpath = PureWindowsPath(PATH)
+    PATH = Path(Wpath)
+
+    frame_n, x, y = image.shape
+
+    # Pairs with a box small enough to be saved
+    rois = df[["big_roi-0", "big_roi-1", "big_roi-2", "big_roi-3"]].to_numpy().astype(int).reshape(-1, 4)
+    selected = np.flatnonzero((rois[:, 1] - rois[:, 0] <= max_size) & (rois[:, 3] - rois[:, 2] <= max_size))
+    rois = rois[selected]
+
+    # Repeated boxes are saved once, then each box is saved as the first bigger box that contains it
+    boxes, box_of_pair = np.unique(rois, axis=0, return_inverse=True)
+    box_of_pair = box_of_pair.ravel()
+    area = (boxes[:, 1] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 2])
+
+    def contains(outer, inner):
+        # Containment matrix, [i, j] is True if the box outer[i] contains the box inner[j]
+        return ((outer[:, np.newaxis, 0] <= inner[:, 0]) & (outer[:, np.newaxis, 1] >= inner[:, 1]) &
+                (outer[:, np.newaxis, 2] <= inner[:, 2]) & (outer[:, np.newaxis, 3] >= inner[:, 3]))
+
+    # The boxes are sorted by area, so a box can only be contained by the boxes before it
+    series_of_box = np.empty(len(boxes), dtype=int)
+    series_boxes = np.empty((len(boxes), 4), dtype=int)
+    series_n = 0
+    order = np.argsort(-area, kind="stable")
+    for start in range(0, len(order), 1024):
+        block = order[start:start + 1024]
+
+        # Boxes of the block inside the boxes saved by the previous blocks (the first one that contains them)
+        inside = contains(series_boxes[:series_n], boxes[block])
+        contained = inside.any(axis=0)
+        if np.any(contained):
+            series_of_box[block[contained]] = np.argmax(inside[:, contained], axis=0)
+
+        # The rest are new boxes unless a new box before them on the block contains them
+        rest = block[~contained]
+        inside = contains(boxes[rest], boxes[rest])
+        new = np.zeros(len(rest), dtype=bool)
+        for box in range(len(rest)):
+            containers = np.flatnonzero(inside[:box, box] & new[:box])
+            if len(containers) > 0:
+                series_of_box[rest[box]] = series_of_box[rest[containers[0]]]
+            else:
+                new[box] = True
+                series_of_box[rest[box]] = series_n
+                series_boxes[series_n] = boxes[rest[box]]
+                series_n += 1
+    series_boxes = series_boxes[:series_n]
+    series = series_of_box[box_of_pair]
+
+    # Centroids of the two objects of each pair, marked in yellow on the crop of its series
+    centroids = np.stack([df[["com-0", "com-1"]].to_numpy()[selected], df[["com2-0", "com2-1"]].to_numpy()[selected]], axis=1).astype(int)
+
+    # CMYK canvas and RGB buffer reused for every frame (the yellow and black channels don't change)
+    ROI = np.zeros((x, y, 4))
+    ROI_rgb = np.empty((x, y, 3), dtype=np.uint8)
+
+    # Crops of each batch of series taken from every frame, then written in order
+    ROIname = str(filename).replace('.tif', '') + "_ROIs"
+    sizes = frame_n * (series_boxes[:, 1] - series_boxes[:, 0]) * (series_boxes[:, 3] - series_boxes[:, 2]) * 3
+    if len(series_boxes) > 0:
+        with TiffWriter(PATH / "ROIs" / (ROIname + ".tif")) as tif:
+            first = 0
+            while first < len(series_boxes):
+                last = first + 1
+                while last < len(series_boxes) and sizes[first:last + 1].sum() <= batch_bytes:
+                    last += 1
+                crops = [np.empty((frame_n, f_x - i_x, f_y - i_y, 3), dtype=np.uint8) for i_x, f_x, i_y, f_y in series_boxes[first:last]]
+
+                for frame in range(frame_n):
+                    ROI[:, :, 0] = image[frame]
+                    ROI[:, :, 1] = image2[frame]
+                    cmyk_to_rgb(ROI[:, :, 0], ROI[:, :, 1], ROI[:, :, 2], ROI[:, :, 3], out=ROI_rgb)
+
+                    for crop, (i_x, f_x, i_y, f_y) in zip(crops, series_boxes[first:last]):
+                        crop[frame] = ROI_rgb[i_x:f_x, i_y:f_y]
+
+                for pair in np.flatnonzero((series >= first) & (series < last)):
+                    crop = crops[series[pair] - first]
+                    for c_x, c_y in centroids[pair] - series_boxes[series[pair], [0, 2]]:
+                        if 0 <= c_x < crop.shape[1] and 0 <= c_y < crop.shape[2]:
+                            crop[:, c_x, c_y] = (255, 255, 0)
+
+                for crop in crops:
+                    tif.write(crop, photometric='rgb')
+                first = last
+
+    # Index of the pairs and their series
+    index = pd.DataFrame({'Result_row': selected, 'Frame': df["Frame"].to_numpy()[selected], 'Pair': selected + 1})
+    index = index.assign(**{'big_roi-' + str(i): rois[:, i] for i in range(4)})
+    index['Series'] = series
+    index = index.assign(**{'Series_roi-' + str(i): series_boxes[series, i] for i in range(4)})
+    index['Offset-0'] = rois[:, 0] - series_boxes[series, 0]
+    index['Offset-1'] = rois[:, 2] - series_boxes[series, 2]
+    index.to_csv(PATH / "ROIs" / (ROIname + ".csv"), index=False)
+
+    return index
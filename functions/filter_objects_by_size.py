@@ -0,0 +1,42 @@
+import numpy as np
+from functions.component_statistics import component_statistics
+
+def filter_objects_by_size(image_labeled:np.ndarray,
+                           min_size:int,
+                           max_size:int = None,
+                           min_frames:int = 1)->np.ndarray:
+    """
+    Keep the objects of a labeled image with a number of pixels between a minimum and a maximum size.
+
+    The size (and number of frames) of every object is obtained at once (see component_statistics)
+    and the mask is built indexing a lookup table of the objects to keep with the labeled image.
+
+    Parameters:
+        image_labeled (numpy.ndarray): Image with the objects labeled (background as 0).
+        min_size (int): Objects with this number of pixels or less are removed.
+        max_size (int, optional): Objects with this number of pixels or more are removed (default: None, no maximum).
+        min_frames (int, optional): Minimum number of frames (first axis) an object has to span (default: 1).
+            The objects are expected to be connected between consecutive frames.
+
+    Returns:
+        numpy.ndarray: A boolean mask of the pixels of the kept objects.
+
+    Example:
+        >>> labeled_bw, num_objects = label(frame, structure=np.ones((3, 3)))
+        >>> mask = filter_objects_by_size(labeled_bw, 64)
+    """
+    # Number of pixels of each label (and number of frames, only if they are needed)
+    if min_frames > 1:
+        sizes, frames, bbox = component_statistics(image_labeled)
+    else:
+        sizes = np.bincount(image_labeled.ravel())
+
+    # Lookup table of the labels to keep (never the background)
+    keep = sizes > min_size
+    if max_size is not None:
+        keep &= sizes < max_size
+    if min_frames > 1:
+        keep &= frames >= min_frames
+    keep[0] = False
+
+    return keep[image_labeled]
@@ -0,0 +1,111 @@
+import numpy as np
+import tifffile
+
+class ImageStack:
+    """
+    Read the frames of a TIFF image lazily instead of loading the whole stack in memory.
+
+    The file is memory-mapped when its data is stored uncompressed. Otherwise it's read through
+    zarr (if installed), which decodes only the requested tiles or strips. If neither is possible
+    the whole image is read.
+
+    The image can be normalized so its maximum value is equal to a given scale (the maximum of
+    the stack is calculated frame by frame). The normalization is applied only to the requested
+    data, so the memory used is of a few frames instead of copies of the stack. It's calculated in
+    float64 by default, as the values of the whole stack were, so the thresholds give the same objects.
+
+    Parameters:
+        filename (str or Path): The name of the TIFF file.
+        scale (float, optional): Value of the maximum of the stack after normalization (default: None, not normalized).
+        float_dtype (numpy.dtype, optional): Float type of the normalized data (default: numpy.float64).
+
+    Example:
+        >>> image = ImageStack(PATH / filename, scale=255)
+        >>> frame = image[3]  # Normalized frame 3 as float64
+        >>> raw_frame = image.raw(3)  # Frame 3 with the values and dtype of the file
+    """
+    def __init__(self, filename, scale:float = None, float_dtype = np.float64):
+        self.filename = filename
+        self.data = self._open(filename)
+        self.shape = tuple(self.data.shape)
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(self.data.dtype)
+        self.scale = scale
+        self.float_dtype = np.dtype(float_dtype)
+        self._max = None
+
+    @staticmethod
+    def _open(filename):
+        # Memory-map the image data if it's stored uncompressed and contiguous
+        try:
+            return tifffile.memmap(filename, mode='r')
+        except ValueError:
+            pass
+
+        # Decode only the requested chunks through zarr if it's installed
+        try:
+            import zarr
+        except ImportError:
+            return tifffile.imread(filename)
+        return zarr.open(tifffile.imread(filename, aszarr=True), mode='r')
+
+    def __len__(self)->int:
+        return self.shape[0]
+
+    def raw(self, key = slice(None))->np.ndarray:
+        """
+        Read part of the image without normalization.
+
+        Parameters:
+            key: Index or slices of the data to read (default: the whole image).
+
+        Returns:
+            numpy.ndarray: The data with the dtype of the file.
+        """
+        return np.asarray(self.data[key])
+
+    def max(self):
+        """
+        Calculate the maximum value of the image reading one frame at a time.
+
+        Returns:
+            The maximum value of the image.
+        """
+        if self._max is None:
+            if self.ndim > 2:
+                self._max = max(np.max(self.raw(i)) for i in range(len(self)))
+            else:
+                self._max = np.max(self.raw())
+        return self._max
+
+    def __getitem__(self, key)->np.ndarray:
+        """
+        Read part of the image, normalized if a scale was given.
+
+        Parameters:
+            key: Index or slices of the data to read (e.g. a frame number).
+
+        Returns:
+            numpy.ndarray: The data normalized to the scale (float_dtype), or with the dtype of the file if there's no scale.
+        """
+        data = self.raw(key)
+        if self.scale is None:
+            return data
+        return data.astype(self.float_dtype) * self.float_dtype.type(self.scale / np.float64(self.max()))
+
+    def binarize(self, threshold:float = 0)->np.ndarray:
+        """
+        Segment the raw image keeping the values over a threshold, one frame at a time.
+
+        Parameters:
+            threshold (float, optional): Values over the threshold are kept (default: 0).
+
+        Returns:
+            numpy.ndarray: A boolean image with the shape of the stack.
+        """
+        if self.ndim <= 2:
+            return self.raw() > threshold
+        binary = np.empty(self.shape, dtype=bool)
+        for i in range(len(self)):
+            np.greater(self.raw(i), threshold, out=binary[i])
+        return binary
@@ -0,0 +1,31 @@
+import os
+from tifffile import imwrite
+
+def imwrite_atomic(filename,
+                   data,
+                   **kwargs)->None:
+    """
+    Write a TIFF image so it's never found incomplete with its final name.
+
+    The image is written to a temporary file on the same directory and renamed to its final name
+    once it's complete. If the writing is interrupted only the temporary file is left behind.
+
+    Parameters:
+        filename (str or Path): The name of the file to write.
+        data (numpy.ndarray or iterator): The image data, as accepted by tifffile.imwrite.
+        **kwargs: Keyword arguments passed to tifffile.imwrite (e.g. shape, dtype, photometric).
+
+    Returns:
+        None
+
+    Example:
+        >>> imwrite_atomic(os.path.join(output_path, file_name + "_join2D.tif"), join2D)
+    """
+    temporary_file = f"{filename}.{os.getpid()}.tmp"
+    try:
+        imwrite(temporary_file, data, **kwargs)
+        os.replace(temporary_file, filename)
+    except BaseException:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+        raise
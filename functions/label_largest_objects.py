@@ -0,0 +1,68 @@
+import numpy as np
+from scipy.ndimage import label, generate_binary_structure
+
+def label_largest_objects(image,
+                          th_percent:float)->tuple:
+    """
+    Find the largest object of every frame of a stack with a single labeling of the stack.
+
+    Each frame is thresholded with a fraction of its maximum intensity and the stack is labeled with
+    a structure without connectivity between frames (4-connectivity on each frame), so each object
+    belongs to a single frame and the labels of each frame follow the labels of the previous one.
+    The largest object of each frame is obtained from the histogram of the labels (the first one if
+    several have the same area). The centers of mass (the same values as scipy.ndimage.center_of_mass)
+    and the bounding boxes of all of them are obtained at once from the coordinates of their pixels.
+
+    Parameters:
+        image (ImageStack): The image, a stack (frames, x, y) or a single frame (x, y).
+        th_percent (float): Fraction of the maximum intensity of each frame used as threshold.
+
+    Returns:
+        tuple: A tuple containing:
+            - labeled (numpy.ndarray): The labeled stack (frames, x, y), a single frame is returned as a stack of 1 frame.
+            - offsets (numpy.ndarray): Last label of the previous frames, the labels of the frame i start at offsets[i] + 1.
+            - largest (numpy.ndarray): Label of the largest object of each frame (0 if the frame has no objects).
+            - area (numpy.ndarray): Number of pixels of the largest object of each frame (0 if the frame has no objects).
+            - centroids (numpy.ndarray): Center of mass (x, y) of the largest object of each frame (nan if the frame has no objects).
+            - bbox (numpy.ndarray): Bounding box (start x, start y, stop x, stop y) of the largest object of each frame.
+
+    Example:
+        >>> labeled, offsets, largest, area, centroids, bbox = label_largest_objects(ImageStack("image.tif"), 0.2)
+        >>> area[3]  # Area of the largest object of the frame 3
+    """
+    frames = [image.raw()] if image.ndim == 2 else map(image.raw, range(len(image)))
+    mask = np.stack([frame > np.max(frame)*th_percent for frame in frames])
+
+    # 2D connectivity on each frame only
+    structure = np.zeros((3, 3, 3), dtype=bool)
+    structure[1] = generate_binary_structure(2, 1)
+    labeled, num_objects = label(mask, structure)
+
+    sizes = np.bincount(labeled.ravel(), minlength=num_objects + 1)
+
+    # Labels of each frame (frames without objects keep the last label of the previous frame)
+    last_label = np.maximum.accumulate(labeled.reshape(len(labeled), -1).max(axis=1, initial=0))
+    offsets = np.concatenate(([0], last_label[:-1]))
+
+    largest = np.zeros(len(labeled), dtype=np.intp)
+    for frame in np.flatnonzero(last_label > offsets):
+        largest[frame] = offsets[frame] + 1 + np.argmax(sizes[offsets[frame] + 1:last_label[frame] + 1])
+
+    found = largest > 0
+    area = sizes[largest] * found
+
+    # Pixels of the largest objects, sorted by frame (a single object per frame)
+    is_largest = np.zeros(num_objects + 1, dtype=bool)
+    is_largest[largest[found]] = True
+    pixels = np.nonzero(is_largest[labeled])
+    starts = np.concatenate(([0], np.cumsum(area[found])[:-1]))
+
+    centroids = np.full((len(labeled), 2), np.nan)
+    bbox = np.zeros((len(labeled), 4), dtype=np.intp)
+    if np.any(found):
+        for axis in (1, 2):
+            centroids[found, axis - 1] = np.add.reduceat(pixels[axis], starts) / area[found]
+            bbox[found, axis - 1] = np.minimum.reduceat(pixels[axis], starts)
+            bbox[found, axis + 1] = np.maximum.reduceat(pixels[axis], starts) + 1
+
+    return labeled, offsets, largest, area, centroids, bbox
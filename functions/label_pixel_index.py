@@ -0,0 +1,33 @@
+import numpy as np
+
+def label_pixel_index(image_labeled:np.ndarray)->list:
+    """
+    Obtain the pixel coordinates of every object of a labeled image in a single pass.
+
+    The labeled pixels are sorted by label once, so the coordinates of each object are read
+    from the index instead of scanning the whole image per object with np.where.
+
+    Parameters:
+        image_labeled (numpy.ndarray): Image with the objects labeled (background as 0).
+
+    Returns:
+        list of numpy.ndarray: A list where the element i contains the coordinates of the pixels
+        of the label i as an array of shape (pixels, image dimensions). The coordinates keep the
+        order np.where would return them. The element 0 (background) is empty.
+
+    Example:
+        >>> pixels = label_pixel_index(image_labeled)
+        >>> POS_A = pixels[3]  # Coordinates of the pixels of the object labeled 3
+    """
+    flat = image_labeled.ravel()
+
+    # Sort the object pixels by label keeping their original order inside each label
+    foreground = np.flatnonzero(flat)
+    order = foreground[np.argsort(flat[foreground], kind='stable')]
+
+    # Number of pixels per label to split the sorted coordinates
+    counts = np.bincount(flat[foreground], minlength=1)
+    counts[0] = 0
+
+    coordinates = np.column_stack(np.unravel_index(order, image_labeled.shape))
+    return np.split(coordinates, np.cumsum(counts)[:-1])
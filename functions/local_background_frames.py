@@ -0,0 +1,40 @@
+import numpy as np
+import cv2
+
+def local_background_frames(image,
+                            ws:int,
+                            method:str = "mean"):
+    """
+    Calculate the local background of the frames of a stack one at a time.
+
+    The local background of each pixel is the mean (or median) of a window around it. It only depends
+    on the window size and the method, so it can be calculated once and shared by segmentations with
+    different thresholds (see local_threshold_frames).
+
+    Parameters:
+        image (ImageStack or numpy.ndarray): The stack (frames, x, y), normalized between 0 and 1.
+        ws (int): Window size of the local mean or median.
+        method (str, optional): Local background, "mean" or "median" (default: "mean").
+            The median is calculated on the frame in 8 bits with a constant-time histogram
+            filter (cv2.medianBlur) and an odd window size (ws + 1 if ws is even).
+
+    Yields:
+        tuple: The frame (float64) and its local background (float64), in order.
+
+    Example:
+        >>> for frame, background in local_background_frames(I, 150):
+        ...     difference = background - frame
+    """
+    if method not in ("mean", "median"):
+        raise ValueError(f"Method {method} not accepted. Select mean or median.")
+
+    for i in range(len(image)):
+        frame = np.asarray(image[i], dtype=np.float64)
+
+        if method == "median":
+            frame_8bit = np.rint(frame * 255).astype(np.uint8)
+            background = cv2.medianBlur(frame_8bit, int(ws) | 1).astype(np.float64) / np.float64(255)
+        else:
+            background = cv2.blur(frame, (int(ws), int(ws)))
+
+        yield frame, background
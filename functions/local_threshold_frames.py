@@ -0,0 +1,64 @@
+import numpy as np
+from functions.local_background_frames import local_background_frames
+
+def local_threshold_frames(image,
+                           ws:int,
+                           r:float,
+                           th_2d:float = 0,
+                           method:str = "mean",
+                           backgrounds = None):
+    """
+    Segment the frames of a stack one at a time comparing each pixel with its local background.
+
+    For each frame the local background is the mean (or median) of a window around each pixel. The difference
+    between the background and the frame, minus a constant (C = -mean(frame)/r), is normalized and
+    the pixels at or below th_2d are kept as objects.
+
+    The normalization keeps the scale the whole stack had when each frame was processed (the
+    maximum of the frames processed so far and of the frames still to process, which count as 0),
+    so only the maximum and minimum values of the processed frames are kept between frames.
+
+    Parameters:
+        image (ImageStack or numpy.ndarray): The stack (frames, x, y), normalized between 0 and 1.
+        ws (int): Window size of the local mean or median.
+        r (float): Factor of the constant subtracted to the difference with the background.
+        th_2d (float, optional): Threshold of the normalized difference (default: 0).
+        method (str, optional): Local background, "mean" or "median" (default: "mean").
+            The median is calculated on the frame in 8 bits with a constant-time histogram
+            filter (cv2.medianBlur) and an odd window size (ws + 1 if ws is even).
+        backgrounds (iterator, optional): The (frame, background) pairs of the stack already calculated with
+            local_background_frames for ws and method (default: None, they are calculated).
+
+    Yields:
+        numpy.ndarray: The boolean mask of the objects of each frame, in order.
+
+    Example:
+        >>> for i, frame_bw in enumerate(local_threshold_frames(I, 150, 1.5)):
+        ...     join2D[i] = filter_objects_by_size(label(frame_bw, structure=np.ones((3, 3)))[0], 64)
+    """
+    if backgrounds is None:
+        backgrounds = local_background_frames(image, ws, method)
+
+    frame_n = len(image)
+
+    # Maximum and minimum of the normalized frames processed so far and value of the frames still to process
+    processed = []
+    pending = np.float64(0)
+
+    for i, (frame, background) in enumerate(backgrounds):
+        # Difference between the local background and the frame
+        C = -np.mean(frame) / r
+        difference = background - frame - C
+
+        # Scale of the stack once the difference of the frame is stored on it
+        values = processed + [np.max(difference), np.min(difference)] + ([pending] if i < frame_n - 1 else [])
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            scale = np.float64(255) / np.max(np.array(values, dtype=np.float64))
+            scaled = np.array(values, dtype=np.float64) * scale
+            processed = [np.max(scaled[:len(processed) + 2]), np.min(scaled[:len(processed) + 2])]
+            pending = pending * scale
+
+            # Pixels at or below the threshold (or undefined) are objects
+            frame_bw = np.logical_not(difference * scale > th_2d)
+
+        yield frame_bw
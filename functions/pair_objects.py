@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+def pair_objects(image_proprieties:pd.DataFrame,
+                 image2_proprieties:pd.DataFrame,
+                 max_distance_px:float)->tuple:
+    """
+    Find the pairs of objects from two images whose centroids are closer than a maximum distance.
+
+    The centroids of both images are indexed in KD-trees and only the neighbours inside the
+    maximum distance are visited, so the cost grows with the number of objects instead of
+    with the product of the number of objects of each image.
+
+    Parameters:
+        image_proprieties (pandas.DataFrame): Properties of the objects of the first image (centroid-0, centroid-1).
+        image2_proprieties (pandas.DataFrame): Properties of the objects of the second image (centroid-0, centroid-1).
+        max_distance_px (float): Squared maximum distance between centroids in pixels.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]: A tuple containing the positional indices
+        of the paired objects in each dataframe and the distance between their centroids. The pairs
+        are sorted as a nested loop over the first and then the second dataframe would find them.
+
+    Example:
+        >>> positions, positions2, distances = pair_objects(image_proprieties, image2_proprieties, 25**2)
+    """
+    centroids = image_proprieties[['centroid-0', 'centroid-1']].to_numpy(dtype=float)
+    centroids2 = image2_proprieties[['centroid-0', 'centroid-1']].to_numpy(dtype=float)
+
+    if len(centroids) == 0 or len(centroids2) == 0 or not max_distance_px > 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty.copy(), np.zeros(0)
+
+    # Query slightly further than the radius, the exact comparison below decides the borderline pairs
+    radius = np.sqrt(max_distance_px) * (1 + 1e-9)
+    tree = cKDTree(centroids)
+    tree2 = cKDTree(centroids2)
+    neighbours = tree.sparse_distance_matrix(tree2, radius, output_type='ndarray')
+
+    # Sort the pairs by the position of the object in the first and then in the second image
+    order = np.lexsort((neighbours['j'], neighbours['i']))
+    positions = neighbours['i'][order].astype(np.intp)
+    positions2 = neighbours['j'][order].astype(np.intp)
+
+    # Calculate the diference of position between the centroids of the objects
+    x_dif = np.abs(centroids[positions, 0] - centroids2[positions2, 0])
+    y_dif = np.abs(centroids[positions, 1] - centroids2[positions2, 1])
+
+    # Keep the pairs closer than the maximum distance (compared squared to avoid the squared root)
+    close = x_dif**2 + y_dif**2 < max_distance_px
+    positions, positions2 = positions[close], positions2[close]
+    distances = np.sqrt(x_dif[close]**2 + y_dif[close]**2)
+
+    return positions, positions2, distances
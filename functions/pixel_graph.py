@@ -0,0 +1,50 @@
+import numpy as np
+
+def pixel_graph(mask:np.ndarray)->tuple:
+    """
+    Build the graph of the neighbouring pixels of a segmented stack.
+
+    Each pixel of the mask is a node and each pair of pixels of the mask that are neighbours
+    (26-connectivity) is an edge, stored once. The edges between pixels of the same frame are
+    the 8-connectivity of each frame. The connected objects of any subset of the pixels can then be
+    obtained with scipy.sparse.csgraph.connected_components without labeling the whole stack.
+
+    Parameters:
+        mask (numpy.ndarray): The segmented stack (frames, x, y).
+
+    Returns:
+        tuple: A tuple containing:
+            - pixels (numpy.ndarray): Flat index of the pixels of the mask (the nodes), in increasing order.
+            - source (numpy.ndarray): Node of the start of each edge.
+            - target (numpy.ndarray): Node of the end of each edge.
+            - same_frame (numpy.ndarray): True for the edges between pixels of the same frame.
+
+    Example:
+        >>> pixels, source, target, same_frame = pixel_graph(join2D)
+        >>> graph = coo_matrix((np.ones(len(source), dtype=bool), (source, target)), shape=(len(pixels), len(pixels)))
+        >>> num_objects, labels = connected_components(graph, directed=False)
+    """
+    pixels = np.flatnonzero(mask)
+    if len(pixels) == 0:
+        return pixels, np.array([], dtype=np.intp), np.array([], dtype=np.intp), np.array([], dtype=bool)
+    coordinates = np.unravel_index(pixels, mask.shape)
+
+    # Half of the 26 neighbours, the other half are the same edges in the opposite direction
+    offsets = [(dz, dy, dx) for dz in (-1, 0, 1) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dz, dy, dx) > (0, 0, 0)]
+
+    source, target, same_frame = [], [], []
+    for offset in offsets:
+        neighbour = [coordinate + shift for coordinate, shift in zip(coordinates, offset)]
+        inside = np.logical_and.reduce([(axis >= 0) & (axis < size) for axis, size in zip(neighbour, mask.shape)])
+        start = np.flatnonzero(inside)
+
+        # Node of each neighbour inside the stack, if it belongs to the mask
+        neighbour_pixels = np.ravel_multi_index([axis[start] for axis in neighbour], mask.shape)
+        end = np.minimum(np.searchsorted(pixels, neighbour_pixels), len(pixels) - 1)
+        connected = pixels[end] == neighbour_pixels
+
+        source.append(start[connected])
+        target.append(end[connected])
+        same_frame.append(np.full(np.count_nonzero(connected), offset[0] == 0))
+
+    return pixels, np.concatenate(source), np.concatenate(target), np.concatenate(same_frame)
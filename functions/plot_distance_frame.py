@@ -0,0 +1,58 @@
+import numpy as np
+from functions.combine_and_draw2 import combine_and_draw2
+from functions.combine_plots import combine_plots
+
+def plot_distance_frame(A:np.ndarray,
+                        B:np.ndarray,
+                        COM_A:tuple,
+                        COM_B:tuple,
+                        A_position:list,
+                        B_position:list,
+                        overlap:np.ndarray,
+                        COM_dis:float,
+                        PER_dis:float,
+                        Path:str)->None:
+    """
+    Draw the distances between the objects of a frame and save the 3 panel visualization.
+
+    The centroids and the nearest points of the objects are joined with a line on the combined
+    labels of the 2 channels (the overlapping pixels are drawn instead when the objects overlap)
+    and the plots are saved with combine_plots. It only needs the labels of the frame and the
+    measurements, so it can be run on a plotting process (see AsyncPlotter).
+
+    Parameters:
+        A (numpy.ndarray): The labels of the frame of the first channel.
+        B (numpy.ndarray): The labels of the frame of the second channel.
+        COM_A (tuple): The centroid (y, x) of the object of the first channel.
+        COM_B (tuple): The centroid (y, x) of the object of the second channel.
+        A_position (list): The nearest point (y, x) of the object of the first channel ("" if the objects overlap).
+        B_position (list): The nearest point (y, x) of the object of the second channel ("" if the objects overlap).
+        overlap (numpy.ndarray): The (y, x) coordinates of the pixels of both objects (empty if they don't overlap).
+        COM_dis (float): The distance between the centroids in um.
+        PER_dis (float or str): The perimeter distance in um ("OVERLAP" or "CONTACT" if there is no distance).
+        Path (str): The path where the plot will be saved.
+
+    Returns:
+        None
+
+    Example:
+        >>> plot_distance_frame(A, B, COM_A, COM_B, A_position, B_position, overlap, COM_Dist_um, Per_Dist_um, "VIZ/image_0.png")
+    """
+    center_of_mass_plot = combine_and_draw2(A, B, COM_A, COM_B)
+
+    if len(overlap) > 0:
+        X, Y = A.shape
+        plot_perimeter_distance = np.zeros((X, Y, 4), dtype=np.uint8)
+        plot_perimeter_distance[:, :, 0] = A*(255/np.max(A))
+        plot_perimeter_distance[:, :, 1] = B*(255/np.max(B))
+        plot_perimeter_distance[overlap[:, 0], overlap[:, 1]] = [0, 77, 255, 0]
+    else:
+        plot_perimeter_distance = combine_and_draw2(A, B, A_position, B_position)
+
+    combine_plots(A = A,
+                  B = B,
+                  image2 = center_of_mass_plot,
+                  image3 = plot_perimeter_distance,
+                  COM_dis = COM_dis,
+                  PER_dis = PER_dis,
+                  Path = Path)
@@ -5,7 +5,8 @@ from pathlib import Path, PureWindowsPath
 import os
 
 from functions.apply_threshold_and_binarize import apply_threshold_and_binarize 
-from functions.combine_and_draw import combine_and_draw
+from functions.draw_lines import draw_lines
+from functions.roi_colors import roi_colors
 from functions.cmyk_to_rgb import cmyk_to_rgb 
 
 def spiderwebs(image:np.ndarray, 
@@ -18,10 +19,14 @@ def spiderwebs(image:np.ndarray,
     """
     Generate spiderweb-like visualizations from image data.
 
+    The lines between the centroids of the pairs of objects of each frame are drawn at once (draw_lines)
+    with the colors of their ROIs classified at once (roi_colors). The visualization is rendered one
+    frame at a time (8 bits) and streamed to the output file.
+
     Parameters:
         image (numpy.ndarray): The first input image data (frame_n, x, y).
         image2 (numpy.ndarray): The second input image data (frame_n, x, y).
-        df (pandas.DataFrame): DataFrame containing object data.
+        df (pandas.DataFrame): DataFrame containing object data (Frame, com-0, com-1, com2-0, com2-1, big_roi-0 to big_roi-3).
         mask (numpy.ndarray): The mask data (frame_n, x, y) for visual analysis.
         filename (str): The name of the output file.
         PATH (str): The path to the directory where the output file will be saved.
@@ -37,44 +42,29 @@ def spiderwebs(image:np.ndarray,
 
     frame_n, x, y = image.shape
     mask_projection = np.sum(mask, axis = 0)
-    Viz = np.zeros((frame_n, x, y, 4))
-    MAP = np.zeros((frame_n, x, y, 3))
-
-    for frame in range(frame_n):
-        
-        Viz[frame, :, :, 0] = apply_threshold_and_binarize(image[frame, :, :], th_percentage)
-        Viz[frame, :, :, 1] = apply_threshold_and_binarize(image2[frame, :, :], th_percentage)
 
-    for obj_i in range(len(df)):
+    # Line colors from the mean of the mask projection inside the ROI of each pair
+    square_colors = roi_colors(df[["big_roi-0", "big_roi-1", "big_roi-2", "big_roi-3"]].to_numpy(), mask_projection)
+    points1 = df[["com-0", "com-1"]].to_numpy()
+    points2 = df[["com2-0", "com2-1"]].to_numpy()
 
-        data = df.loc[obj_i]
-        frame = int(data['Frame'])
+    # Pairs of each frame, in the order of the DataFrame
+    frames = df["Frame"].to_numpy().astype(int)
+    order = np.argsort(frames, kind="stable")
+    bounds = np.searchsorted(frames[order], np.arange(frame_n + 1))
 
-        roi = data['big_roi']
-        i_x = int(roi[0])
-        f_x = int(roi[1])
-        i_y = int(roi[2])
-        f_y = int(roi[3])
+    def render_frames():
+        for frame in range(frame_n):
+            Viz = np.zeros((x, y, 4), dtype=np.uint8)
+            Viz[:, :, 0] = apply_threshold_and_binarize(image[frame], th_percentage)
+            Viz[:, :, 1] = apply_threshold_and_binarize(image2[frame], th_percentage)
 
-        if mask_projection[i_x:f_x, i_y:f_y].size > 0:
-            if np.mean(mask_projection[i_x:f_x, i_y:f_y]) > 1.5:
-                square_color = [0, 0, 255, 0]
-            else:
-                square_color = [0, 127, 255, 0]
-        else:
-            square_color = [255, 0, 0, 0]
-         
-        Viz[frame, :,:,:] = combine_and_draw(Viz[frame, :,:,:], data['com'], data['com2'], square_color)
+            # Draw the lines between the centroids of every pair of the frame at once
+            pairs = order[bounds[frame]:bounds[frame + 1]]
+            draw_lines(Viz, points1[pairs], points2[pairs], square_colors[pairs])
 
-    for frame in range(frame_n):
-
-        Cyan = Viz[frame, :, :, 0] 
-        Magenta = Viz[frame, :, :, 1]
-        Yellow = Viz[frame, :, :, 2]
-        Black = Viz[frame, :, :, 3]
-        PreMAP = cmyk_to_rgb(Cyan, Magenta, Yellow, Black)
-        MAP[frame,:,:,:] = PreMAP
+            yield cmyk_to_rgb(Viz[:, :, 0], Viz[:, :, 1], Viz[:, :, 2], Viz[:, :, 3])
 
     viz_file = str(filename)+"ROI_MAP_SPIDERWEB.tif"
-    
-    imwrite(PATH / "ROI_MAPS" / viz_file, MAP.astype(np.uint8))
+
+    imwrite(PATH / "ROI_MAPS" / viz_file, render_frames(), shape=(frame_n, x, y, 3), dtype=np.uint8)
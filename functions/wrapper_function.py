@@ -4,9 +4,9 @@ from datetime import datetime
 import os
 
 def log_function_call(log_file):
-"""
-Creates a log file containing the call of the function executed with the given parameters.
-"""
+    """
+    Creates a log file containing the call of the function executed with the given parameters.
+    """
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):